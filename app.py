@@ -1,42 +1,349 @@
-from flask import Flask, render_template, jsonify, request, redirect, url_for
+from flask import Flask, Response, render_template, jsonify, request, redirect, url_for, make_response, session
+import base64
+import functools
+import gzip
+import hashlib
+import json
+import os
+import pickle
 import random
 import math
+import mmap
+import re
+import struct
+import threading
+import time
+import uuid
+from array import array
+from collections import OrderedDict
+
+import click
+
+import images
+import instrument
+import solver
+from events import ChannelRegistry
+from pool import MazePool
+from segment_index import SegmentIndex
+from shared_store import SharedStore
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
 
 app = Flask(__name__)
+# Visibility is kept in the signed session cookie; set SECRET_KEY when running
+# more than one process so every worker can read it
+app.secret_key = os.environ.get('SECRET_KEY') or os.urandom(24)
+instrument.init_app(app)
 
 class Path:
-    def __init__(self, id, label, segments, color="#ecf0f1", visible=True):
+    """A labelled path of the maze
+    
+    While the maze is being generated the segments are a plain list. Once
+    it is done, Maze.pack_paths() moves them into one array shared by all
+    paths (four ints per segment) and fixes the label position and bounds,
+    after which the segments are read-only.
+    """
+    __slots__ = ('id', 'label', 'color', 'cell_indices', 'grid_size', 'label_position', 'bounds',
+                 'segment_list', 'segment_table', 'segment_start', 'segment_stop')
+    
+    def __init__(self, id, label, segments, color="#ecf0f1"):
         self.id = id  # Unique identifier for the path
         self.label = label  # Display label for the path
-        self.segments = segments  # List of segment tuples ((x1,y1), (x2,y2))
+        self.segment_list = segments  # List of segment tuples ((x1,y1), (x2,y2)) until packed
+        self.segment_table = None  # Shared array('i') of x0, y0, x1, y1 per segment once packed
+        self.segment_start = self.segment_stop = 0  # This path's slice of segment_table
         self.color = color  # Color of the path
-        self.visible = visible  # Whether the path is visible
-        self.cells = []  # List of cells that make up the path
+        self.cell_indices = array('i')  # Flat grid indices of the path's cells, set once by the maze
+        self.grid_size = 0  # Row length of the grid the indices refer to
+        self.label_position = None  # (x, y) cell for the label
+        self.bounds = None  # (x0, y0, x1, y1) of the cells covered, inclusive
+    
+    @property
+    def segments(self):
+        """List of segment tuples ((x1,y1), (x2,y2))"""
+        if self.segment_table is None:
+            return self.segment_list
+        return [((x0, y0), (x1, y1)) for x0, y0, x1, y1 in self.segment_coords()]
+    
+    def segment_coords(self):
+        """Iterate over the segments as flat (x0, y0, x1, y1) tuples
+        
+        Rendering walks the shared table directly this way instead of
+        building the list of nested tuples that segments returns.
+        """
+        if self.segment_table is None:
+            return ((x0, y0, x1, y1) for (x0, y0), (x1, y1) in self.segment_list)
+        coords = iter(self.segment_table[self.segment_start:self.segment_stop])
+        return zip(coords, coords, coords, coords)
+    
+    @property
+    def cells(self):
+        """Cells that make up the path, as (x, y) tuples"""
+        return tuple(divmod(index, self.grid_size) for index in self.cell_indices)
+    
+    def pack(self, table):
+        """Append the segments to a shared table and fix the label position"""
+        segments = self.segment_list
+        self.segment_start = len(table)
+        for (x0, y0), (x1, y1) in segments:
+            table.extend((x0, y0, x1, y1))
+        self.segment_stop = len(table)
+        self.segment_table = table
+        self.segment_list = None
         
+        # Place the label near the middle of the path: the middle point of the middle segment
+        if segments:
+            (x0, y0), (x1, y1) = segments[len(segments) // 2]
+            self.label_position = (int((x0 + x1) / 2), int((y0 + y1) / 2))
+    
     def get_label_position(self):
-        """Calculate a good position to place the label"""
-        # Try to find a position near the middle of the path
-        if len(self.segments) > 0:
-            # Get the middle segment
-            middle_segment = self.segments[len(self.segments) // 2]
-            # Get the middle point of that segment
-            (x0, y0), (x1, y1) = middle_segment
-            return (int((x0 + x1) / 2), int((y0 + y1) / 2))
-        return None
+        """Return a good position to place the label"""
+        return self.label_position
 
-# Store the maze as a global variable to persist path visibility states
+# Store the maze as a global variable; it is shared by all requests and never
+# mutated after generation (visibility lives in MazeState)
 maze = None
+maze_lock = threading.Lock()
+
+# Seeded mazes served by /maze/<seed>, created by get_pool()
+maze_pool = None
+
+# Process pool for CPU-heavy work (set by asgi.py); None runs it in-process
+executor = None
+
+# On-disk cache of rendered images, created by get_image_cache()
+image_cache = None
+
+# Maze and channel state shared between worker processes (MAZE_SHARED_DIR);
+# None keeps them in this process
+shared_store = SharedStore(os.environ['MAZE_SHARED_DIR']) if os.environ.get('MAZE_SHARED_DIR') else None
+
+# Shared visibility channels (?channel=) whose changes are pushed to /events
+channels = ChannelRegistry(store=shared_store, refresh=lambda: get_maze())
+
+# Header of Maze.to_buffer(): magic, pickled geometry length, grid length
+MAZE_BUFFER_HEADER = struct.Struct('<8sQQ')
+MAZE_BUFFER_MAGIC = b'MAZEBUF2'
+
+# Cell codes stored in Maze.cells
+WALL = 0
+PATH = 1
+ENTRANCE = 2
+EXIT = 3
+
+# Grid size the classic layout was designed for; other sizes scale from it
+BASE_SIZE = 64
+
+# Supported range of maze sizes and hub path counts for generate_maze()
+MIN_SIZE = 32
+MAX_SIZE = 4096
+MIN_HUB_PATHS = 18
+MAX_HUB_PATHS = 24
+
+# Paths of the classic layout that end at the hub
+HUB_PATH_IDS = ("main_left", "main_right", "exit_path", "path1", "path2", "path3", "path4", "path5", "path6")
+
+# Labels for the extra hub paths, in creation order
+HUB_PATH_LABELS = ("Iota", "Kappa", "Lambda", "Mu", "Nu", "Xi", "Omicron", "Pi", "Rho",
+                   "Sigma", "Tau", "Upsilon", "Phi", "Chi", "Psi")
+
+# Starting points tried for each extra hub path before giving up on its slot
+HUB_PATH_ATTEMPTS = 20
+
+# Translation table from cell codes to the characters of MazeState.grid
+CELL_CHARS = bytes.maketrans(bytes([WALL, PATH, ENTRANCE, EXIT]), b" .EX")
+
+# CSS class used for each cell code in the rendered HTML
+CELL_CLASSES = {WALL: "wall", PATH: "path", ENTRANCE: "entrance", EXIT: "exit"}
+
+# Width and height of one cell on the page, in pixels
+CELL_PX = 10
+
+# Colour of each cell code in rendered images (matches the page's CSS);
+# PNGs use them as the palette, indexed by cell code
+CELL_COLORS = {WALL: "#2c3e50", PATH: "#ecf0f1", ENTRANCE: "#27ae60", EXIT: "#e74c3c"}
+PNG_PALETTE = [CELL_COLORS[code] for code in (WALL, PATH, ENTRANCE, EXIT)]
+
+# Cells between the grid lines of the overlay (100px on the page)
+GRID_SPACING = 10
+
+# Blocks along each side of a tile; at zoom z a block is 2**z cells square
+TILE_SIZE = 64
+MAX_TILE_ZOOM = 12
+
+# Tile formats served by /tile/<z>/<x>/<y>
+TILE_TYPES = {'html': 'text/html; charset=utf-8', 'png': 'image/png'}
+
+# Image formats served by /image.<format>
+IMAGE_TYPES = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+# Precomputed element templates for each cell code
+CELL_TEMPLATES = {code: f'<div class="{name}" data-x="{{x}}" data-y="{{y}}"></div>' for code, name in CELL_CLASSES.items()}
+SINGLE_TEMPLATES = {code: f'<div class="{name}"></div>' for code, name in CELL_CLASSES.items()}
+RUN_TEMPLATES = {code: f'<div class="{name}" style="width: {{width}}px"></div>' for code, name in CELL_CLASSES.items()}
+
+# Matches a run of identical cell codes within a row
+RUN_PATTERN = re.compile(rb'(.)\1*', re.DOTALL)
+
+# Tables that move a 2-bit cell code into each position of a packed byte
+PACK_SHIFTS = [bytes((code << shift) & 0xFF for code in range(256)) for shift in (6, 4, 2, 0)]
+
+def pack_cells(cells):
+    """Pack cell codes four to a byte (2 bits each, first cell in the high bits)"""
+    padded = bytes(cells) + bytes(-len(cells) % 4)
+    length = len(padded) // 4
+    packed = 0
+    for position, table in enumerate(PACK_SHIFTS):
+        packed |= int.from_bytes(padded[position::4].translate(table), 'big')
+    return packed.to_bytes(length, 'big')
+
+def run_length_encode(cells):
+    """Encode cell codes as a flat list of alternating code and run length"""
+    runs = []
+    for run in RUN_PATTERN.finditer(bytes(cells)):
+        runs.append(cells[run.start()])
+        runs.append(run.end() - run.start())
+    return runs
+
+def row_html(row):
+    """HTML for one row of cells, with one element per run of identical cells"""
+    return '<div class="row">' + ''.join(
+        RUN_TEMPLATES[row[run.start()]].format(width=(run.end() - run.start()) * CELL_PX)
+        if run.end() - run.start() > 1 else SINGLE_TEMPLATES[row[run.start()]]
+        for run in RUN_PATTERN.finditer(row)
+    ) + '</div>'
+
+def encode_cells_png(cells, width, height):
+    """Encode a flat row-major block of cell codes as a 2-bit indexed-colour PNG"""
+    cells = bytes(cells)
+    # Each scanline is packed separately, so pad rows to whole bytes first
+    if width % 4:
+        padding = bytes(-width % 4)
+        cells = b''.join(cells[i:i + width] + padding for i in range(0, width * height, width))
+    packed = pack_cells(cells)
+    row_bytes = (width + 3) // 4
+    scanlines = b''.join(b'\x00' + packed[i:i + row_bytes] for i in range(0, len(packed), row_bytes))
+    return images.encode_png(width, height, scanlines, PNG_PALETTE, bit_depth=2)
+
+def rect_path(x0, y0, x1, y1):
+    """SVG path data for the cells x0..x1, y0..y1 (rows map to SVG y)"""
+    return f'M{y0} {x0}h{y1 - y0 + 1}v{x1 - x0 + 1}h-{y1 - y0 + 1}z'
+
+def grid_row_label(row):
+    """Letter label of an overlay grid row: A-Z, then AA, AB, ..."""
+    label = ''
+    row += 1
+    while row:
+        row, remainder = divmod(row - 1, 26)
+        label = chr(ord('A') + remainder) + label
+    return label
+
+def choose_content_encoding(accept_encoding):
+    """Pick the best compression the client accepts ('br', 'gzip' or None)"""
+    if brotli is not None and 'br' in accept_encoding:
+        return 'br'
+    if 'gzip' in accept_encoding:
+        return 'gzip'
+    return None
+
+def compress(payload, content_encoding):
+    """Compress a payload with the given content encoding"""
+    if content_encoding == 'br':
+        return brotli.compress(payload)
+    if content_encoding == 'gzip':
+        return gzip.compress(payload, mtime=0)
+    return payload
+
+# Bytes of rendered output each maze's render cache may hold (a per_cell page
+# of a 1024 maze alone is about 50 MB)
+RENDER_CACHE_BYTES = int(os.environ.get('MAZE_RENDER_CACHE_BYTES', 32 * 1024 * 1024))
+
+def cached_size(value):
+    """Bytes counted against the render cache budget for a value"""
+    return len(value) if isinstance(value, (str, bytes)) else 0
+
+class RenderCache:
+    """Small thread-safe LRU cache for rendered maze output
+    
+    Entries are evicted when there are more than maxsize of them or they
+    hold more than maxbytes of rendered text and images together.
+    """
+    def __init__(self, maxsize=128, maxbytes=RENDER_CACHE_BYTES):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        """Return the cached value for key, or None"""
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entries if full"""
+        size = cached_size(value)
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= cached_size(self.entries.pop(key))
+            # Output bigger than the whole budget is not worth evicting everything for
+            if size > self.maxbytes:
+                return
+            self.entries[key] = value
+            self.bytes += size
+            while len(self.entries) > self.maxsize or self.bytes > self.maxbytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= cached_size(evicted)
+                self.evictions += 1
+    
+    def clear(self):
+        """Drop all cached entries (counters are kept)"""
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+    
+    def stats(self):
+        """Return the cache counters for monitoring"""
+        with self.lock:
+            return {
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+                'bytes': self.bytes,
+                'maxbytes': self.maxbytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
 
 class Maze:
-    def __init__(self, size=64):
+    """Maze geometry: the empty grid and the paths drawn on it
+    
+    A Maze is not changed after generation, so one instance can be shared
+    between threads. Which paths are shown is kept in a MazeState.
+    """
+    def __init__(self, size=64, seed=None, hub_paths=None):
         self.size = size
-        self.grid = [[" " for _ in range(size)] for _ in range(size)]
+        self.seed = seed  # Seed for the layout; None uses the global random state
+        self.hub_paths = hub_paths  # Paths converging on the hub; None for the classic layout only
+        self.scale = size / BASE_SIZE  # The layout was designed for a 64x64 grid
         self.center = (size // 2, size // 2)
         self.entrance = (0, size // 2)
         self.exit = (size - 1, size // 2)
-        self.empty_size = 10  # Size of the empty space
-        self.border_offset = 3  # Offset from the actual border
-        self.min_straight = 5   # Minimum straight segment length
+        self.empty_size = self.scaled(10)  # Size of the empty space
+        self.border_offset = self.scaled(3)  # Offset from the actual border
+        self.min_straight = self.scaled(5)   # Minimum straight segment length
         
         # Dictionary to store all paths by ID
         self.paths = {}
@@ -47,35 +354,76 @@ class Maze:
         # Dictionary to store intersection points for later connections
         self.intersection_points = {}
         
+        # Rendered output keyed by visibility bitmask
+        self.render_cache = RenderCache()
+        
+        # Paths reaching each tile, by tile bounds (see tile_paths_mask)
+        self.tile_masks = {}
+        
         # Generate the maze
         self.generate()
     
     def generate(self):
         """Generate the maze with labeled paths"""
-        # Create empty space in the middle
-        self.create_center()
+        # A new layout invalidates anything rendered from the old one
+        if self.seed is None:
+            self.random = random
+            self.token = uuid.uuid4().hex[:12]
+        else:
+            # Seeded mazes are reproducible, so their token is too
+            self.random = random.Random(self.seed)
+            self.token = f'{self.size}-{self.seed}-{self.hub_paths or 0}'
+        self.render_cache.clear()
+        self.paths = {}
+        self.label_to_id = {}
+        self.intersection_points = {}
+        
+        # Flat row-major grid of cell codes: cell (x, y) lives at x * size + y
+        self.base_cells = bytearray(self.size * self.size)
         
-        # Mark entrance and exit
-        self.create_entrance_exit()
+        with instrument.phase('create_center'):
+            # Create empty space in the middle
+            self.create_center()
+            
+            # Mark entrance and exit
+            self.create_entrance_exit()
+        
+        # Freeze the empty grid; every state starts from a copy of it
+        self.base_cells = bytes(self.base_cells)
         
         # Create and add all paths
-        self.create_all_paths()
+        with instrument.phase('create_all_paths'):
+            self.create_all_paths()
         
-        # Draw all paths onto the grid
-        self.reset_grid_and_draw_paths()
+        # Work out which cells each path covers
+        with instrument.phase('rasterize_paths'):
+            self.pack_paths()
+            self.rasterize_paths()
     
     def create_center(self):
         """Create the empty center space"""
         cx, cy = self.center
-        for i in range(-self.empty_size, self.empty_size+1):
-            for j in range(-self.empty_size, self.empty_size+1):
-                if 0 <= cx+i < self.size and 0 <= cy+j < self.size:
-                    self.grid[cx+i][cy+j] = "."  # Empty space
+        # Clip the center square to the grid, then paint one slice per row
+        y0 = max(0, cy - self.empty_size)
+        y1 = min(self.size, cy + self.empty_size + 1)
+        if y0 >= y1:
+            return
+        row_fill = bytes([PATH]) * (y1 - y0)
+        for x in range(max(0, cx - self.empty_size), min(self.size, cx + self.empty_size + 1)):
+            self.base_cells[x * self.size + y0:x * self.size + y1] = row_fill
     
     def create_entrance_exit(self):
         """Mark the entrance and exit on the grid"""
-        self.grid[self.entrance[0]][self.entrance[1]] = "E"  # Entrance
-        self.grid[self.exit[0]][self.exit[1]] = "X"  # Exit
+        self.base_cells[self.cell_index(*self.entrance)] = ENTRANCE
+        self.base_cells[self.cell_index(*self.exit)] = EXIT
+    
+    def cell_index(self, x, y):
+        """Return the position of cell (x, y) in the flat grid"""
+        return x * self.size + y
+    
+    def scaled(self, value):
+        """Scale a distance from the 64x64 layout to this maze's size"""
+        return max(1, round(value * self.scale))
     
     def create_all_paths(self):
         """Create all paths in the maze"""
@@ -89,6 +437,10 @@ class Maze:
         
         # Additional paths
         self.create_additional_paths(cx, cy)
+        
+        # Extra paths so the requested number converge on the hub
+        if self.hub_paths:
+            self.create_hub_paths(cx, cy)
     
     def create_main_left_path(self, start_x, start_y, cx, cy):
         """Create the main left path that follows the border"""
@@ -107,9 +459,9 @@ class Maze:
         ]
         
         # Store intersection points
-        self.intersection_points['left_bottom'] = (self.border_offset + 15, self.size - self.border_offset)
-        self.intersection_points['left_vertical'] = (self.border_offset, cy - 10)
-        self.intersection_points['left_approach'] = (cx - self.empty_size - 8, cy + self.min_straight)
+        self.intersection_points['left_bottom'] = (self.border_offset + self.scaled(15), self.size - self.border_offset)
+        self.intersection_points['left_vertical'] = (self.border_offset, cy - self.scaled(10))
+        self.intersection_points['left_approach'] = (cx - self.empty_size - self.scaled(8), cy + self.min_straight)
         
         # Create the path object
         left_path = Path(
@@ -139,9 +491,9 @@ class Maze:
         ]
         
         # Store intersection points
-        self.intersection_points['right_top'] = (self.size - self.border_offset - 15, self.border_offset)
-        self.intersection_points['right_vertical'] = (self.size - self.border_offset, cy + 10)
-        self.intersection_points['right_approach'] = (cx + self.empty_size + 8, cy - self.min_straight)
+        self.intersection_points['right_top'] = (self.size - self.border_offset - self.scaled(15), self.border_offset)
+        self.intersection_points['right_vertical'] = (self.size - self.border_offset, cy + self.scaled(10))
+        self.intersection_points['right_approach'] = (cx + self.empty_size + self.scaled(8), cy - self.min_straight)
         
         # Create the path object
         right_path = Path(
@@ -167,8 +519,8 @@ class Maze:
         ]
         
         # Store intersection point for exit path
-        self.intersection_points['exit_vertical'] = (cx + self.empty_size + self.min_straight, cy + 10)
-        self.intersection_points['exit_horizontal'] = (cx + self.empty_size + self.min_straight + 7, self.exit[1])
+        self.intersection_points['exit_vertical'] = (cx + self.empty_size + self.min_straight, cy + self.scaled(10))
+        self.intersection_points['exit_horizontal'] = (cx + self.empty_size + self.min_straight + self.scaled(7), self.exit[1])
         
         # Create the path object
         exit_path = Path(
@@ -187,53 +539,53 @@ class Maze:
         self.create_path_with_segments(
             "path1", "Delta",
             [
-                ((self.border_offset + 10, self.border_offset), (self.border_offset + 10, self.border_offset + 15)),
-                ((self.border_offset + 10, self.border_offset + 15), (cx - self.empty_size - 1, self.border_offset + 15))
+                ((self.border_offset + self.scaled(10), self.border_offset), (self.border_offset + self.scaled(10), self.border_offset + self.scaled(15))),
+                ((self.border_offset + self.scaled(10), self.border_offset + self.scaled(15)), (cx - self.empty_size - 1, self.border_offset + self.scaled(15)))
             ],
             [
-                ((self.border_offset + 10, self.border_offset), (self.intersection_points['right_top'][0], self.border_offset))
+                ((self.border_offset + self.scaled(10), self.border_offset), (self.intersection_points['right_top'][0], self.border_offset))
             ]
         )
         
         self.create_path_with_segments(
             "path2", "Gamma",
             [
-                ((self.size - self.border_offset - 10, self.border_offset), (self.size - self.border_offset - 10, self.border_offset + 25)),
-                ((self.size - self.border_offset - 10, self.border_offset + 25), (cx + self.empty_size + 1, self.border_offset + 25))
+                ((self.size - self.border_offset - self.scaled(10), self.border_offset), (self.size - self.border_offset - self.scaled(10), self.border_offset + self.scaled(25))),
+                ((self.size - self.border_offset - self.scaled(10), self.border_offset + self.scaled(25)), (cx + self.empty_size + 1, self.border_offset + self.scaled(25)))
             ],
             [
-                ((self.size - self.border_offset - 10, self.border_offset + 25), (self.size - self.border_offset - 10, cy - self.min_straight))
+                ((self.size - self.border_offset - self.scaled(10), self.border_offset + self.scaled(25)), (self.size - self.border_offset - self.scaled(10), cy - self.min_straight))
             ]
         )
         
         self.create_path_with_segments(
             "path3", "Epsilon",
             [
-                ((self.border_offset + 20, self.size - self.border_offset), (self.border_offset + 20, self.size - self.border_offset - 15)),
-                ((self.border_offset + 20, self.size - self.border_offset - 15), (cx - self.empty_size - 1, self.size - self.border_offset - 15))
+                ((self.border_offset + self.scaled(20), self.size - self.border_offset), (self.border_offset + self.scaled(20), self.size - self.border_offset - self.scaled(15))),
+                ((self.border_offset + self.scaled(20), self.size - self.border_offset - self.scaled(15)), (cx - self.empty_size - 1, self.size - self.border_offset - self.scaled(15)))
             ],
             [
-                ((self.border_offset + 20, self.size - self.border_offset), (self.intersection_points['left_bottom'][0], self.size - self.border_offset))
+                ((self.border_offset + self.scaled(20), self.size - self.border_offset), (self.intersection_points['left_bottom'][0], self.size - self.border_offset))
             ]
         )
         
         self.create_path_with_segments(
             "path4", "Zeta",
             [
-                ((self.size - self.border_offset - 15, self.size - self.border_offset), (self.size - self.border_offset - 15, self.size - self.border_offset - 25)),
-                ((self.size - self.border_offset - 15, self.size - self.border_offset - 25), (cx + self.empty_size + 1, self.size - self.border_offset - 25))
+                ((self.size - self.border_offset - self.scaled(15), self.size - self.border_offset), (self.size - self.border_offset - self.scaled(15), self.size - self.border_offset - self.scaled(25))),
+                ((self.size - self.border_offset - self.scaled(15), self.size - self.border_offset - self.scaled(25)), (cx + self.empty_size + 1, self.size - self.border_offset - self.scaled(25)))
             ],
             [
-                ((self.size - self.border_offset - 15, self.size - self.border_offset), (self.size - self.border_offset, self.size - self.border_offset))
+                ((self.size - self.border_offset - self.scaled(15), self.size - self.border_offset), (self.size - self.border_offset, self.size - self.border_offset))
             ]
         )
         
         self.create_path_with_segments(
             "path5", "Eta",
             [
-                ((self.border_offset, cy - 15), (self.border_offset + 12, cy - 15)),
-                ((self.border_offset + 12, cy - 15), (self.border_offset + 12, cy - 5)),
-                ((self.border_offset + 12, cy - 5), (cx - self.empty_size - 1, cy - 5))
+                ((self.border_offset, cy - self.scaled(15)), (self.border_offset + self.scaled(12), cy - self.scaled(15))),
+                ((self.border_offset + self.scaled(12), cy - self.scaled(15)), (self.border_offset + self.scaled(12), cy - self.scaled(5))),
+                ((self.border_offset + self.scaled(12), cy - self.scaled(5)), (cx - self.empty_size - 1, cy - self.scaled(5)))
             ],
             []
         )
@@ -241,23 +593,23 @@ class Maze:
         self.create_path_with_segments(
             "path6", "Theta",
             [
-                ((self.size - self.border_offset, cy + 15), (self.size - self.border_offset - 12, cy + 15)),
-                ((self.size - self.border_offset - 12, cy + 15), (self.size - self.border_offset - 12, cy + 5)),
-                ((self.size - self.border_offset - 12, cy + 5), (cx + self.empty_size + 1, cy + 5))
+                ((self.size - self.border_offset, cy + self.scaled(15)), (self.size - self.border_offset - self.scaled(12), cy + self.scaled(15))),
+                ((self.size - self.border_offset - self.scaled(12), cy + self.scaled(15)), (self.size - self.border_offset - self.scaled(12), cy + self.scaled(5))),
+                ((self.size - self.border_offset - self.scaled(12), cy + self.scaled(5)), (cx + self.empty_size + 1, cy + self.scaled(5)))
             ],
             [
-                ((self.size - self.border_offset - 12, cy + 15), (self.intersection_points['exit_vertical'][0], cy + 15))
+                ((self.size - self.border_offset - self.scaled(12), cy + self.scaled(15)), (self.intersection_points['exit_vertical'][0], cy + self.scaled(15)))
             ]
         )
         
         # Add connections between paths
         connection_segments = [
             # Connect path 1 and path 5
-            ((self.border_offset + 10, self.border_offset + 15), (self.border_offset + 12, cy - 15)),
+            ((self.border_offset + self.scaled(10), self.border_offset + self.scaled(15)), (self.border_offset + self.scaled(12), cy - self.scaled(15))),
             # Connect path 3 and path 4 via bottom
-            ((self.border_offset + 20, self.size - self.border_offset - 10), (self.size - self.border_offset - 15, self.size - self.border_offset - 10)),
+            ((self.border_offset + self.scaled(20), self.size - self.border_offset - self.scaled(10)), (self.size - self.border_offset - self.scaled(15), self.size - self.border_offset - self.scaled(10))),
             # Connect path 2 and path 6
-            ((self.size - self.border_offset - 10, self.border_offset + 15), (self.size - self.border_offset - 12, cy + 5))
+            ((self.size - self.border_offset - self.scaled(10), self.border_offset + self.scaled(15)), (self.size - self.border_offset - self.scaled(12), cy + self.scaled(5)))
         ]
         
         # Create connections path
@@ -270,7 +622,7 @@ class Maze:
         # Add l-shaped segments
         for start, end in connection_segments:
             l_segments = self.get_l_shaped_segments(start, end)
-            connections_path.segments.extend(l_segments)
+            connections_path.segment_list.extend(l_segments)
         
         # Add to paths dictionary
         self.paths["connections"] = connections_path
@@ -287,6 +639,96 @@ class Maze:
         self.paths[path_id] = path
         self.label_to_id[label.lower()] = path_id  # Store lowercase label to path ID mapping
     
+    def create_hub_paths(self, cx, cy):
+        """Create extra paths from the border paths into the hub
+        
+        Each path starts on a cell of Alpha or Beta (so it leads back to the
+        entrance) and makes a 90-degree approach to a free slot on one side
+        of the hub. Paths that would touch Omega are rejected, so only one
+        path still leads to the exit.
+        """
+        classic = sum(1 for path_id in self.paths if path_id in HUB_PATH_IDS)
+        extra = self.hub_paths - classic
+        if extra <= 0:
+            return
+        if extra > len(HUB_PATH_LABELS):
+            raise ValueError(f"at most {classic + len(HUB_PATH_LABELS)} hub paths are supported")
+        
+        # Border cells the new paths can start from
+        starts = []
+        for path_id in ("main_left", "main_right"):
+            for segment in self.paths[path_id].segments[1:]:
+                (x0, y0), (x1, y1) = self.clip_segment(segment)
+                starts.extend((x, y) for x in range(min(x0, x1), max(x0, x1) + 1)
+                              for y in range(min(y0, y1), max(y0, y1) + 1))
+        
+        # Cells next to the exit path are off limits
+        forbidden = set()
+        for x, y in self.rasterize_segments(self.paths["exit_path"].segments):
+            for nx, ny in ((x, y), (x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+                if not self.is_center(nx, ny):
+                    forbidden.add((nx, ny))
+        
+        # Slots along each side of the hub, keeping existing approaches free
+        low, high = -self.empty_size + 1, self.empty_size - 1
+        spacing = max(2, self.scaled(3))
+        taken = {(x, y) for path in self.paths.values() for (_, _), (x, y) in path.segments[-1:]}
+        slots = [(side, offset) for side in ("top", "bottom", "left", "right")
+                 for offset in range(low, high + 1, spacing)]
+        self.random.shuffle(slots)
+        # Small mazes may run out of well-spaced slots; fall back to the gaps
+        spare = [(side, offset) for side in ("top", "bottom", "left", "right")
+                 for offset in range(low + spacing // 2, high + 1, spacing)]
+        self.random.shuffle(spare)
+        slots += spare
+        
+        created = 0
+        for side, offset in slots:
+            if created == extra:
+                break
+            if side == "top":
+                end = (cx - self.empty_size - 1, cy + offset)
+            elif side == "bottom":
+                end = (cx + self.empty_size + 1, cy + offset)
+            elif side == "left":
+                end = (cx + offset, cy - self.empty_size - 1)
+            else:
+                end = (cx + offset, cy + self.empty_size + 1)
+            if end in taken or end in forbidden:
+                continue
+            
+            # Try a few starting points on the correct side of the hub
+            for _ in range(HUB_PATH_ATTEMPTS):
+                start = self.random.choice(starts)
+                if side == "top" and start[0] >= end[0] or side == "bottom" and start[0] <= end[0] \
+                        or side == "left" and start[1] >= end[1] or side == "right" and start[1] <= end[1]:
+                    continue
+                # Finish with a straight approach into the hub
+                if side in ("top", "bottom"):
+                    segments = [(start, (start[0], end[1])), ((start[0], end[1]), end)]
+                else:
+                    segments = [(start, (end[0], start[1])), ((end[0], start[1]), end)]
+                cells = self.rasterize_segments(segments)
+                if forbidden.isdisjoint(cells) and not any(self.is_center(x, y) for x, y in cells):
+                    break
+            else:
+                continue
+            
+            label = HUB_PATH_LABELS[created]
+            created += 1
+            taken.add(end)
+            self.create_path_with_segments(f"spoke{created}", label, segments)
+    
+    def rasterize_segments(self, segments):
+        """Return the set of (x, y) cells covered by a list of segments"""
+        cells = set()
+        for segment in segments:
+            (x0, y0), (x1, y1) = self.clip_segment(segment)
+            if y0 == y1 or x0 == x1:
+                cells.update((x, y) for x in range(min(x0, x1), max(x0, x1) + 1)
+                             for y in range(min(y0, y1), max(y0, y1) + 1))
+        return cells
+    
     def get_l_shaped_segments(self, start, end):
         """Create an L-shaped path with a 90-degree turn between start and end"""
         x0, y0 = start
@@ -294,7 +736,7 @@ class Maze:
         
         # Create the intermediate point for the 90-degree turn
         # Choose to go horizontal first then vertical
-        if random.random() < 0.5:
+        if self.random.random() < 0.5:
             return [
                 ((x0, y0), (x1, y0)),  # Horizontal segment
                 ((x1, y0), (x1, y1))   # Vertical segment
@@ -305,126 +747,401 @@ class Maze:
                 ((x0, y1), (x1, y1))   # Horizontal segment
             ]
     
-    def toggle_path(self, path_id_or_label):
-        """Toggle the visibility of a path by its ID or label"""
-        path_id = path_id_or_label
-        
-        # Check if the input is a label
-        if path_id_or_label.lower() in self.label_to_id:
-            path_id = self.label_to_id[path_id_or_label.lower()]
-        
-        if path_id in self.paths:
-            self.paths[path_id].visible = not self.paths[path_id].visible
-            self.reset_grid_and_draw_paths()
-            return True, path_id
-        return False, path_id_or_label
+    def __getstate__(self):
+        """Pickle the geometry only; caches and random state are rebuilt"""
+        state = self.__dict__.copy()
+        del state['render_cache']
+        del state['tile_masks']
+        del state['random']
+        state.pop('_segment_index', None)
+        # A grid mapped from shared memory is copied out
+        state['base_cells'] = bytes(self.base_cells)
+        return state
     
-    def reset_grid_and_draw_paths(self):
-        """Reset the grid and redraw all paths"""
-        # Reset the grid (keep entrance, exit, and center)
-        for i in range(self.size):
-            for j in range(self.size):
-                if (i, j) == self.entrance:
-                    self.grid[i][j] = "E"
-                elif (i, j) == self.exit:
-                    self.grid[i][j] = "X"
-                elif self.is_center(i, j):
-                    self.grid[i][j] = "."
-                else:
-                    self.grid[i][j] = " "
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.render_cache = RenderCache()
+        self.tile_masks = {}
+        self.random = random if self.seed is None else random.Random(self.seed)
+    
+    def to_buffer(self):
+        """Serialize the maze as a header, the pickled geometry and the raw grid"""
+        state = self.__getstate__()
+        grid = state.pop('base_cells')
+        geometry = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        return MAZE_BUFFER_HEADER.pack(MAZE_BUFFER_MAGIC, len(geometry), len(grid)) + geometry + grid
+    
+    @classmethod
+    def from_buffer(cls, buffer):
+        """Rebuild a maze from to_buffer() output without copying the grid
         
-        # Draw all visible paths
-        self.draw_paths()
+        The grid stays a read-only view of buffer (e.g. a memory-mapped
+        file), so processes mapping the same file share one copy of it.
+        """
+        view = memoryview(buffer)
+        magic, geometry_length, grid_length = MAZE_BUFFER_HEADER.unpack_from(view)
+        if magic != MAZE_BUFFER_MAGIC:
+            raise ValueError("not a maze buffer")
+        start = MAZE_BUFFER_HEADER.size
+        maze = cls.__new__(cls)
+        maze.__setstate__(pickle.loads(view[start:start + geometry_length]))
+        start += geometry_length
+        maze.base_cells = view[start:start + grid_length].toreadonly()
+        return maze
+    
+    @property
+    def segment_index(self):
+        """Index of which paths touch each other, built on first use"""
+        index = self.__dict__.get('_segment_index')
+        if index is None:
+            index = self._segment_index = SegmentIndex(self)
+        return index
+    
+    def resolve_path(self, path_id_or_label):
+        """Return the path ID for an ID or (case-insensitive) label, or None"""
+        if path_id_or_label in self.paths:
+            return path_id_or_label
+        return self.label_to_id.get(path_id_or_label.lower())
     
     def is_center(self, i, j):
         """Check if a cell is in the center area"""
         cx, cy = self.center
         return abs(i - cx) <= self.empty_size and abs(j - cy) <= self.empty_size
     
-    def draw_paths(self):
-        """Draw all path segments onto the grid"""
-        # Draw each path's segments to the grid
-        for path_id, path in self.paths.items():
-            if path.visible:
-                for segment in path.segments:
-                    self.draw_segment(segment, path)
+    def clip_segment(self, segment):
+        """Clamp a segment's endpoints to the grid"""
+        (x0, y0), (x1, y1) = segment
+        x0, y0, x1, y1 = self.clip_coords(x0, y0, x1, y1)
+        return (x0, y0), (x1, y1)
     
-    def draw_segment(self, segment, path):
-        """Draw a single segment on the grid with path information"""
-        start, end = segment
-        x0, y0 = start
-        x1, y1 = end
-        
-        # Make sure coordinates are in bounds
-        x0 = max(0, min(x0, self.size - 1))
-        y0 = max(0, min(y0, self.size - 1))
-        x1 = max(0, min(x1, self.size - 1))
-        y1 = max(0, min(y1, self.size - 1))
-        
-        # Store all cells for this segment
-        segment_cells = []
+    def clip_coords(self, x0, y0, x1, y1):
+        """Clamp flat segment coordinates (see Path.segment_coords) to the grid"""
+        limit = self.size - 1
+        return (max(0, min(x0, limit)), max(0, min(y0, limit)),
+                max(0, min(x1, limit)), max(0, min(y1, limit)))
+    
+    def segment_slice(self, x0, y0, x1, y1):
+        """Return the slice of the flat grid covered by a segment, or None"""
+        x0, y0, x1, y1 = self.clip_coords(x0, y0, x1, y1)
         
-        # Horizontal line
+        # Horizontal line (x varies, so it is a strided column in the flat grid)
         if y0 == y1:
             start_x, end_x = min(x0, x1), max(x0, x1)
-            for x in range(start_x, end_x + 1):
-                if 0 <= x < self.size and 0 <= y0 < self.size:
-                    if self.grid[x][y0] == " ":
-                        self.grid[x][y0] = "."
-                    segment_cells.append((x, y0))
-        # Vertical line
+            return slice(self.cell_index(start_x, y0), self.cell_index(end_x, y0) + 1, self.size)
+        # Vertical line (y varies, so it is a contiguous run in the flat grid)
         elif x0 == x1:
             start_y, end_y = min(y0, y1), max(y0, y1)
-            for y in range(start_y, end_y + 1):
-                if 0 <= x0 < self.size and 0 <= y < self.size:
-                    if self.grid[x0][y] == " ":
-                        self.grid[x0][y] = "."
-                    segment_cells.append((x0, y))
-        
-        # Add these cells to the path
-        path.cells.extend(segment_cells)
+            return slice(self.cell_index(x0, start_y), self.cell_index(x0, end_y) + 1, 1)
+        return None
+    
+    def pack_paths(self):
+        """Move every path's segments into one shared array"""
+        self.segment_table = array('i')
+        for path in self.paths.values():
+            path.pack(self.segment_table)
     
-    def to_html(self):
-        """Generate HTML for the maze with path labels"""
-        html = '<div class="maze">'
+    def rasterize_paths(self):
+        """Compute the fixed set of grid cells covered by each path, and their bounds"""
+        size = self.size
+        for path in self.paths.values():
+            indices = set()
+            for coords in path.segment_coords():
+                cells = self.segment_slice(*coords)
+                if cells is not None:
+                    indices.update(range(cells.start, cells.stop, cells.step))
+            path.cell_indices = array('i', sorted(indices))
+            path.grid_size = size
+            if indices:
+                # Indices are sorted, so the first and last give the rows
+                columns = [index % size for index in path.cell_indices]
+                path.bounds = (path.cell_indices[0] // size, min(columns), path.cell_indices[-1] // size, max(columns))
+    
+    def new_state(self, visible=None):
+        """Create a visibility state for this maze (all paths visible by default)"""
+        return MazeState(self, visible)
+    
+    def state_from_mask(self, mask):
+        """Create a visibility state from a bitmask made by visibility_mask()"""
+        return MazeState(self, [path_id for bit, path_id in enumerate(self.paths) if mask >> bit & 1])
+    
+    @instrument.timed('to_html')
+    def to_html(self, state, per_cell=False):
+        """Generate HTML for the maze with path labels
+        
+        By default each run of identical cells in a row becomes a single
+        element whose width spans the run. Pass per_cell=True for the
+        original one-element-per-cell output with data-x/data-y attributes.
+        """
+        parts = ['<div class="maze">']
         
         # First create the maze cells
-        for i, row in enumerate(self.grid):
-            html += '<div class="row">'
-            for j, cell in enumerate(row):
-                cell_class = "wall"
-                data_attrs = f'data-x="{i}" data-y="{j}"'
-                
-                if cell == ".":
-                    cell_class = "path"
-                elif cell == "E":
-                    cell_class = "entrance"
-                elif cell == "X":
-                    cell_class = "exit"
-                
-                html += f'<div class="{cell_class}" {data_attrs}></div>'
-            html += '</div>'
-        html += '</div>'
+        size = self.size
+        cells = state.cells
+        if per_cell:
+            for i in range(size):
+                row = cells[i * size:(i + 1) * size]
+                parts.append('<div class="row">')
+                parts.extend(CELL_TEMPLATES[cell].format(x=i, y=j) for j, cell in enumerate(row))
+                parts.append('</div>')
+        else:
+            # Many rows are identical (e.g. all wall), so render each distinct row once
+            rendered_rows = {}
+            for i in range(size):
+                row = bytes(cells[i * size:(i + 1) * size])
+                html = rendered_rows.get(row)
+                if html is None:
+                    html = rendered_rows[row] = row_html(row)
+                parts.append(html)
+        parts.append('</div>')
         
         # Add labels container
-        html += '<div class="path-labels">'
+        parts.append('<div class="path-labels">')
         
         # Now add labels for each path at their calculated positions
         for path_id, path in self.paths.items():
-            if path.label and path.visible:  # Only show labels for visible paths
+            if path.label and path_id in state.visible:  # Only show labels for visible paths
                 label_pos = path.get_label_position()
                 if label_pos:
                     x, y = label_pos
                     # Convert grid coordinates to pixel coordinates (10px per cell)
-                    px = y * 10
-                    py = x * 10
-                    html += f'<div class="path-label" style="left: {px}px; top: {py}px;" data-path-id="{path_id}">{path.label}</div>'
+                    px = y * CELL_PX
+                    py = x * CELL_PX
+                    parts.append(f'<div class="path-label" style="left: {px}px; top: {py}px;" data-path-id="{path_id}">{path.label}</div>')
         
-        html += '</div>'
+        parts.append('</div>')
         
-        return html
+        return ''.join(parts)
 
-    def get_path_info(self):
+    @instrument.timed('to_png')
+    def to_png(self, state):
+        """Render the grid as an indexed-colour PNG with one pixel per cell"""
+        return encode_cells_png(state.cells, self.size, self.size)
+    
+    @instrument.timed('to_svg')
+    def to_svg(self, state):
+        """Render the maze as SVG with a single <path> per visible Path"""
+        size = self.size
+        parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{size * CELL_PX}" height="{size * CELL_PX}" '
+                 f'viewBox="0 0 {size} {size}" shape-rendering="crispEdges">',
+                 f'<rect width="{size}" height="{size}" fill="{CELL_COLORS[WALL]}"/>']
+        
+        # The empty center
+        cx, cy = self.center
+        limit = size - 1
+        hub = (max(0, cx - self.empty_size), max(0, cy - self.empty_size),
+               min(limit, cx + self.empty_size), min(limit, cy + self.empty_size))
+        if hub[0] <= hub[2] and hub[1] <= hub[3]:
+            parts.append(f'<path class="center" fill="{CELL_COLORS[PATH]}" d="{rect_path(*hub)}"/>')
+        
+        # Each visible path as the union of its segment rectangles
+        for path_id, path in self.paths.items():
+            if path_id not in state.visible:
+                continue
+            rects = []
+            for coords in path.segment_coords():
+                x0, y0, x1, y1 = self.clip_coords(*coords)
+                if x0 == x1 or y0 == y1:
+                    rects.append(rect_path(min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)))
+            parts.append(f'<path data-path-id="{path_id}" fill="{path.color}" d="{"".join(rects)}"/>')
+        
+        # Entrance and exit go on top, as on the grid
+        for (x, y), code in ((self.entrance, ENTRANCE), (self.exit, EXIT)):
+            parts.append(f'<rect class="{CELL_CLASSES[code]}" x="{y}" y="{x}" width="1" height="1" fill="{CELL_COLORS[code]}"/>')
+        parts.append('</svg>')
+        return ''.join(parts)
+    
+    def overlay_svg(self, state):
+        """Render the page overlay (grid lines and visible path labels) as a transparent SVG"""
+        px = self.size * CELL_PX
+        step = GRID_SPACING * CELL_PX
+        parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{px}" height="{px}" viewBox="0 0 {px} {px}" '
+                 f'font-family="monospace" font-size="8">']
+        
+        # Grid lines with letter labels for rows and number labels for columns
+        for i, offset in enumerate(range(0, px, step)):
+            parts.append(f'<rect x="0" y="{offset}" width="{px}" height="1" fill="#fff" fill-opacity="0.2"/>')
+            parts.append(f'<text x="2" y="{offset - 1}" fill="#fff" fill-opacity="0.5">{grid_row_label(i)}</text>')
+            parts.append(f'<rect x="{offset}" y="0" width="1" height="{px}" fill="#fff" fill-opacity="0.2"/>')
+            parts.append(f'<text x="{offset + 2}" y="9" fill="#fff" fill-opacity="0.5">{i}</text>')
+        
+        # Labels of the visible paths, centred on their label positions
+        for path_id, path in self.paths.items():
+            if path.label and path_id in state.visible:
+                label_pos = path.get_label_position()
+                if label_pos:
+                    x, y = label_pos
+                    width = len(path.label) * 5 + 4  # About 5px per monospace character plus padding
+                    parts.append(f'<rect x="{y * CELL_PX - width / 2:g}" y="{x * CELL_PX - 6}" width="{width}" height="12" '
+                                 f'rx="2" fill="#000" fill-opacity="0.6"/>')
+                    parts.append(f'<text x="{y * CELL_PX}" y="{x * CELL_PX + 3}" fill="#fff" text-anchor="middle" '
+                                 f'data-path-id="{path_id}">{path.label}</text>')
+        parts.append('</svg>')
+        return ''.join(parts)
+    
+    def tile_bounds(self, z, x, y):
+        """Return (x0, y0, x1, y1, step) of the cells tile x, y at zoom z covers, or None
+        
+        Tile x counts rows and tile y columns, like cell coordinates. A tile
+        shows each block of step x step cells (step = 2**z) as one cell, so
+        it is at most TILE_SIZE blocks square at every zoom level.
+        """
+        if not 0 <= z <= MAX_TILE_ZOOM or x < 0 or y < 0:
+            return None
+        step = 1 << z
+        span = TILE_SIZE * step
+        x0, y0 = x * span, y * span
+        if x0 >= self.size or y0 >= self.size:
+            return None
+        return x0, y0, min(self.size, x0 + span) - 1, min(self.size, y0 + span) - 1, step
+    
+    def tile_paths_mask(self, bounds):
+        """Bitmask of the paths that can change a tile: their cells or label fall inside it"""
+        # Kept apart from the render cache: one small int per tile, never stale
+        mask = self.tile_masks.get(bounds)
+        if mask is None:
+            x0, y0, x1, y1, _ = bounds
+            mask = 0
+            for bit, path in enumerate(self.paths.values()):
+                box = path.bounds
+                label = path.get_label_position()
+                if ((box and box[0] <= x1 and box[2] >= x0 and box[1] <= y1 and box[3] >= y0)
+                        or (label and x0 <= label[0] <= x1 and y0 <= label[1] <= y1)):
+                    mask |= 1 << bit
+            self.tile_masks[bounds] = mask
+        return mask
+    
+    def tile_cells(self, visible, bounds):
+        """Return the cell codes of a tile as a list of rows, one code per block
+        
+        A block shows the entrance or exit if it holds one, else PATH if
+        any of its cells is open, so thin paths stay visible when zoomed
+        out. Only the hub and the visible paths reaching the tile are
+        drawn, so the cost does not grow with the maze.
+        """
+        x0, y0, x1, y1, step = bounds
+        width = (y1 - y0) // step + 1
+        rows = [bytearray([WALL]) * width for _ in range((x1 - x0) // step + 1)]
+        
+        def fill(rx0, ry0, rx1, ry1):
+            # Open every block touched by an inclusive rectangle of cells
+            rx0, ry0, rx1, ry1 = max(rx0, x0), max(ry0, y0), min(rx1, x1), min(ry1, y1)
+            if rx0 > rx1 or ry0 > ry1:
+                return
+            j0 = (ry0 - y0) // step
+            j1 = (ry1 - y0) // step
+            run = bytes([PATH]) * (j1 - j0 + 1)
+            for i in range((rx0 - x0) // step, (rx1 - x0) // step + 1):
+                rows[i][j0:j1 + 1] = run
+        
+        # The empty center, as create_center() paints it
+        cx, cy = self.center
+        fill(cx - self.empty_size, cy - self.empty_size, cx + self.empty_size, cy + self.empty_size)
+        
+        for path_id, path in self.paths.items():
+            box = path.bounds
+            if path_id not in visible or not box or box[0] > x1 or box[2] < x0 or box[1] > y1 or box[3] < y0:
+                continue
+            for coords in path.segment_coords():
+                sx0, sy0, sx1, sy1 = self.clip_coords(*coords)
+                if sx0 == sx1 or sy0 == sy1:  # Diagonal segments are never drawn
+                    fill(min(sx0, sx1), min(sy0, sy1), max(sx0, sx1), max(sy0, sy1))
+        
+        # The entrance and exit win over the rest of their block
+        for (ex, ey), code in ((self.entrance, ENTRANCE), (self.exit, EXIT)):
+            if x0 <= ex <= x1 and y0 <= ey <= y1:
+                rows[(ex - x0) // step][(ey - y0) // step] = code
+        return rows
+    
+    def tile_html(self, visible, bounds):
+        """Render a tile as an HTML fragment, with the labels that fall inside it"""
+        x0, y0, x1, y1, step = bounds
+        parts = [f'<div class="maze-tile" data-x0="{x0}" data-y0="{y0}" data-step="{step}">', '<div class="maze">']
+        parts.extend(row_html(bytes(row)) for row in self.tile_cells(visible, bounds))
+        parts.append('</div>')
+        
+        # Labels are placed relative to the tile, in blocks
+        parts.append('<div class="path-labels">')
+        for path_id, path in self.paths.items():
+            label_pos = path.get_label_position()
+            if path.label and path_id in visible and label_pos and x0 <= label_pos[0] <= x1 and y0 <= label_pos[1] <= y1:
+                x, y = label_pos
+                px = (y - y0) * CELL_PX // step
+                py = (x - x0) * CELL_PX // step
+                parts.append(f'<div class="path-label" style="left: {px}px; top: {py}px;" data-path-id="{path_id}">{path.label}</div>')
+        parts.append('</div></div>')
+        return ''.join(parts)
+    
+    def tile_png(self, visible, bounds):
+        """Render a tile as a PNG with one pixel per block"""
+        rows = self.tile_cells(visible, bounds)
+        return encode_cells_png(b''.join(rows), len(rows[0]), len(rows))
+    
+    def visibility_mask(self, path_ids):
+        """Return a bitmask of the given paths (one bit per path, in creation order)"""
+        mask = 0
+        for bit, path_id in enumerate(self.paths):
+            if path_id in path_ids:
+                mask |= 1 << bit
+        return mask
+    
+    def cached_html(self, state, per_cell=False):
+        """Return to_html() for a state, cached by its visibility bitmask"""
+        key = ('html', state.mask, per_cell)
+        html = self.render_cache.get(key)
+        if html is None:
+            html = offload_maze(render_html, self, sorted(state.visible), per_cell)
+            self.render_cache.put(key, html)
+        return html
+    
+    def cached_path_info(self, state):
+        """Return get_path_info() for a state, cached by its visibility bitmask"""
+        key = ('info', state.mask)
+        paths_info = self.render_cache.get(key)
+        if paths_info is None:
+            paths_info = self.get_path_info(state)
+            self.render_cache.put(key, paths_info)
+        return paths_info
+    
+    def etag(self, state, per_cell=False):
+        """Return the ETag for a page showing a state"""
+        return f'{self.token}-{state.mask:x}' + ('-cells' if per_cell else '')
+    
+    def export(self, encoding='rle'):
+        """Describe the maze for clients that draw it themselves
+        
+        The grid is the empty maze (center, entrance and exit) as either a
+        run-length list ('rle') or base64 of 2-bit packed cells ('packed').
+        Paths are given as their segments, flattened to [x0, y0, x1, y1].
+        """
+        if encoding == 'packed':
+            grid = base64.b64encode(pack_cells(self.base_cells)).decode('ascii')
+        else:
+            grid = run_length_encode(self.base_cells)
+        
+        paths = {}
+        for path_id, path in self.paths.items():
+            label_pos = path.get_label_position()
+            paths[path_id] = {
+                'label': path.label,
+                'color': path.color,
+                'segments': [list(coords) for coords in path.segment_coords()],
+                'labelPosition': list(label_pos) if label_pos else None
+            }
+        
+        return {
+            'token': self.token,
+            'size': self.size,
+            'entrance': list(self.entrance),
+            'exit': list(self.exit),
+            'center': list(self.center),
+            'emptySize': self.empty_size,
+            'codes': {name: code for code, name in CELL_CLASSES.items()},
+            'encoding': encoding,
+            'grid': grid,
+            'paths': paths
+        }
+    
+    def get_path_info(self, state):
         """Get information about all paths in the maze"""
         paths_info = {}
         for path_id, path in self.paths.items():
@@ -434,29 +1151,357 @@ class Maze:
                 paths_info[path_id] = {
                     'id': path_id,
                     'label': path.label,
-                    'visible': path.visible,
+                    'visible': path_id in state.visible,
                     'color': path.color,
                     'labelPosition': {'x': y, 'y': x}  # Swap x and y for pixel coordinates
                 }
         return paths_info
 
-@app.route('/')
-def index():
+def generate_maze(size=64, seed=None, hub_paths=None):
+    """Generate a maze of any supported size with 18-24 paths converging on the hub
+    
+    The number of hub paths is drawn from the seed unless given, so the same
+    seed and size always produce the same maze.
+    """
+    if not MIN_SIZE <= size <= MAX_SIZE:
+        raise ValueError(f"size must be between {MIN_SIZE} and {MAX_SIZE}")
+    if hub_paths is None:
+        hub_paths = random.Random(seed).randint(MIN_HUB_PATHS, MAX_HUB_PATHS)
+    elif not MIN_HUB_PATHS <= hub_paths <= MAX_HUB_PATHS:
+        raise ValueError(f"hub_paths must be between {MIN_HUB_PATHS} and {MAX_HUB_PATHS}")
+    return Maze(size=size, seed=seed, hub_paths=hub_paths)
+
+class MazeState:
+    """Which paths of a maze are visible, plus the grid drawn for them
+    
+    States are cheap and meant to live for one request or one session. The
+    grid is only drawn when first needed and is then updated incrementally.
+    """
+    def __init__(self, maze, visible=None):
+        self.maze = maze
+        # IDs of the visible paths
+        self.visible = set(maze.paths if visible is None else (path_id for path_id in visible if path_id in maze.paths))
+        self._cells = None  # Drawn grid of cell codes, built lazily
+        self._coverage = None  # Number of visible paths covering each cell
+    
+    @property
+    def mask(self):
+        """Bitmask of the visible paths"""
+        return self.maze.visibility_mask(self.visible)
+    
+    @property
+    def cells(self):
+        """Flat grid of cell codes with the visible paths drawn"""
+        if self._cells is None:
+            self.reset_grid_and_draw_paths()
+        return self._cells
+    
+    @property
+    def grid(self):
+        """Character view of the grid (list of rows of " ", ".", "E", "X")"""
+        size = self.maze.size
+        rows = bytes(self.cells).translate(CELL_CHARS).decode('ascii')
+        return [list(rows[i:i + size]) for i in range(0, size * size, size)]
+    
+    def toggle_path(self, path_id_or_label):
+        """Toggle the visibility of a path by its ID or label"""
+        path_id = self.maze.resolve_path(path_id_or_label)
+        if path_id is None:
+            return False, path_id_or_label
+        self.set_path_visible(path_id, path_id not in self.visible)
+        return True, path_id
+    
+    def set_path_visible(self, path_id, visible, previous=None):
+        """Show or hide a single path, touching only that path's cells
+        
+        If a dict is passed as previous, the old code of every cell written
+        is recorded in it (the first write to a cell wins).
+        """
+        visible = bool(visible)
+        if (path_id in self.visible) == visible:
+            return
+        if visible:
+            self.visible.add(path_id)
+        else:
+            self.visible.discard(path_id)
+        
+        # Nothing to update until the grid is drawn
+        if self._cells is None:
+            return
+        
+        cells = self._cells
+        coverage = self._coverage
+        base = self.maze.base_cells
+        if visible:
+            for index in self.maze.paths[path_id].cell_indices:
+                count = coverage[index]
+                coverage[index] = count + 1
+                if count == 0 and base[index] == WALL:
+                    if previous is not None:
+                        previous.setdefault(index, cells[index])
+                    cells[index] = PATH
+        else:
+            for index in self.maze.paths[path_id].cell_indices:
+                count = coverage[index] - 1
+                coverage[index] = count
+                if count == 0:
+                    if previous is not None:
+                        previous.setdefault(index, cells[index])
+                    cells[index] = base[index]
+    
+    def apply_changes(self, changes):
+        """Apply many visibility changes with a single incremental redraw
+        
+        changes is a list of (path_id, visible) pairs, where visible=None
+        flips the path. Returns the IDs of paths whose visibility changed and
+        the sorted flat indices of cells whose code changed.
+        """
+        before = set(self.visible)
+        previous = {}
+        self.cells  # Make sure the grid is drawn so changed cells can be tracked
+        for path_id, visible in changes:
+            if visible is None:
+                visible = path_id not in self.visible
+            self.set_path_visible(path_id, visible, previous)
+        changed_paths = [path_id for path_id in self.maze.paths if (path_id in before) != (path_id in self.visible)]
+        changed_cells = sorted(index for index, code in previous.items() if self._cells[index] != code)
+        return changed_paths, changed_cells
+    
+    def cell_runs(self, indices):
+        """Group sorted flat indices into [x, y, length, code] runs along rows"""
+        size = self.maze.size
+        cells = self.cells
+        runs = []
+        for index in indices:
+            code = cells[index]
+            if runs:
+                x, y, length, last_code = runs[-1]
+                if index == x * size + y + length and code == last_code and index % size != 0:
+                    runs[-1][2] += 1
+                    continue
+            runs.append([index // size, index % size, 1, code])
+        return runs
+    
+    def set_visible_paths(self, path_ids):
+        """Make exactly the given paths visible"""
+        path_ids = set(path_ids)
+        for path_id in self.maze.paths:
+            self.set_path_visible(path_id, path_id in path_ids)
+    
+    def reset_grid_and_draw_paths(self):
+        """Reset the grid and redraw all paths"""
+        # Reset the grid (keep entrance, exit, and center)
+        self._cells = bytearray(self.maze.base_cells)
+        self._coverage = bytearray(len(self._cells))
+        
+        # Draw all visible paths
+        with instrument.phase('draw_paths'):
+            self.draw_paths()
+    
+    def draw_paths(self):
+        """Draw all path segments onto the grid"""
+        # Draw each path's segments to the grid
+        for path_id, path in self.maze.paths.items():
+            if path_id in self.visible:
+                for coords in path.segment_coords():
+                    self.draw_segment(coords, path)
+                for index in path.cell_indices:
+                    self._coverage[index] += 1
+        
+        # Paths only ever cover walls, so put the entrance and exit back on top
+        self._cells[self.maze.cell_index(*self.maze.entrance)] = ENTRANCE
+        self._cells[self.maze.cell_index(*self.maze.exit)] = EXIT
+    
+    def draw_segment(self, coords, path):
+        """Draw a single segment, given as flat (x0, y0, x1, y1) coordinates, on the grid"""
+        cells = self.maze.segment_slice(*coords)
+        if cells is not None:
+            self._cells[cells] = bytes([PATH]) * len(range(cells.start, cells.stop, cells.step))
+
+def offload(func, *args, **kwargs):
+    """Run func in the worker processes if there are any, else in this thread
+    
+    Arguments and results are pickled, so func must be a module-level
+    function and mazes travel without their caches.
+    """
+    if executor is None:
+        return func(*args, **kwargs)
+    return executor.submit(func, *args, **kwargs).result()
+
+# Mazes each worker process keeps between offloaded calls, by token
+WORKER_MAZES = 4
+worker_mazes = OrderedDict()
+
+class MazeNotLoaded(Exception):
+    """Raised in a worker process asked to use a maze it has not been sent yet"""
+
+def call_with_maze(func, token, maze, *args):
+    """Run func(maze, *args) in a worker, with the maze sent now or kept from an earlier call"""
+    if maze is None:
+        maze = worker_mazes.get(token)
+        if maze is None:
+            raise MazeNotLoaded(token)
+        worker_mazes.move_to_end(token)
+    else:
+        worker_mazes[token] = maze
+        while len(worker_mazes) > WORKER_MAZES:
+            worker_mazes.popitem(last=False)
+    return func(maze, *args)
+
+def offload_maze(func, maze, *args):
+    """Like offload(func, maze, *args), but only pickle the maze for workers that lack it
+    
+    A large maze is megabytes of pickle, so calls first send just its
+    token and only resend with the maze if the worker picked has none.
+    """
+    if executor is None:
+        return func(maze, *args)
+    try:
+        return executor.submit(call_with_maze, func, maze.token, None, *args).result()
+    except MazeNotLoaded:
+        return executor.submit(call_with_maze, func, maze.token, maze, *args).result()
+
+def render_html(maze, visible, per_cell=False):
+    """Render the maze HTML for a set of visible paths (offloadable)"""
+    return maze.to_html(maze.new_state(visible), per_cell=per_cell)
+
+def render_image(maze, visible, layer, image_format):
+    """Render an image layer for a set of visible paths as bytes (offloadable)"""
+    state = maze.new_state(visible)
+    if layer == 'overlay':
+        return maze.overlay_svg(state).encode('utf-8')
+    if image_format == 'png':
+        return maze.to_png(state)
+    return maze.to_svg(state).encode('utf-8')
+
+def solve_visible(maze, visible, include_route=False):
+    """Solve the maze for a set of visible paths (offloadable)"""
+    return solver.solve(maze.new_state(visible), include_route)
+
+def load_snapshot(path):
+    """Load a maze written by the build-snapshot command, memory-mapping its grid"""
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return Maze.from_buffer(buffer)
+
+def create_default_maze():
+    """Build the shared maze: from the MAZE_SNAPSHOT file if set, else a new random one"""
+    snapshot = os.environ.get('MAZE_SNAPSHOT')
+    if snapshot:
+        return load_snapshot(snapshot)
+    return offload(Maze)
+
+def get_maze():
+    """Return the shared maze, creating it on first use"""
     global maze
+    if shared_store is not None:
+        # Follow the maze published (or regenerated) by any worker process
+        current = shared_store.current_maze(create_default_maze, Maze.from_buffer)
+        if current is not maze:
+            with maze_lock:
+                old_maze, maze = maze, current
+            if old_maze is not None and old_maze is not current:
+                channels.move(old_maze, current)
+        return current
     if maze is None:
-        maze = Maze()
+        with maze_lock:
+            if maze is None:
+                maze = create_default_maze()
+    return maze
+
+def get_pool():
+    """Return the pool of seeded mazes, creating it on first use"""
+    global maze_pool
+    if maze_pool is None:
+        with maze_lock:
+            if maze_pool is None:
+                cache_dir = os.environ.get('MAZE_CACHE_DIR', os.path.join(app.instance_path, 'mazes'))
+                maze_pool = MazePool(functools.partial(offload, generate_maze), capacity=int(os.environ.get('MAZE_POOL_CAPACITY', 32)),
+                                     cache_dir=cache_dir, validator=functools.partial(offload, solver.validate))
+    return maze_pool
+
+def get_image_cache():
+    """Return the on-disk image cache, creating it on first use"""
+    global image_cache
+    if image_cache is None:
+        with maze_lock:
+            if image_cache is None:
+                image_cache = images.ImageCache(os.environ.get('MAZE_IMAGE_DIR', os.path.join(app.instance_path, 'images')))
+    return image_cache
+
+def request_seed():
+    """Return the seed of the maze the request refers to, or None for the shared maze"""
+    return (request.view_args or {}).get('seed', request.args.get('seed', type=int))
+
+def get_request_maze(seed=None):
+    """Return the maze a request refers to: a seeded one (?seed=) or the shared default"""
+    if seed is None:
+        seed = request.args.get('seed', type=int)
+    if seed is None:
+        return get_maze()
+    return get_pool().get(seed)
+
+def get_session_state(maze):
+    """Load the visibility state stored in the user's session"""
+    if session.get('maze') == maze.token:
+        return maze.state_from_mask(session.get('visible', 0))
+    return maze.new_state()
+
+def save_session_state(state):
+    """Store a visibility state in the user's session"""
+    session['maze'] = state.maze.token
+    session['visible'] = state.mask
+
+def get_channel(maze, name=None):
+    """Return the shared channel named by ?channel=, or None to use the session"""
+    name = name or request.args.get('channel')
+    if not name:
+        return None
+    return channels.get(maze, name)
+
+def get_visible_state(maze):
+    """Return the visibility state of the request's channel or session"""
+    channel = get_channel(maze)
+    if channel is not None:
+        return maze.new_state(channel.snapshot()['visible'])
+    return get_session_state(maze)
+
+def update_visibility(maze, changes, diff=False):
+    """Apply (path_id, visible) changes to the request's channel or session
+    
+    Channel changes are always diffed and pushed to its subscribers.
+    Returns (visible path IDs, changed path IDs, changed cell runs); the
+    runs are None for session changes made without diff.
+    """
+    channel = get_channel(maze)
+    if channel is not None:
+        return channel.apply(changes)
     
+    state = get_session_state(maze)
+    if diff:
+        changed_paths, changed_cells = state.apply_changes(changes)
+        runs = state.cell_runs(changed_cells)
+    else:
+        # The grid is never drawn, so this only updates the visible set
+        before = set(state.visible)
+        for path_id, visible in changes:
+            state.set_path_visible(path_id, path_id not in state.visible if visible is None else visible)
+        changed_paths = [path_id for path_id in maze.paths if (path_id in before) != (path_id in state.visible)]
+        runs = None
+    save_session_state(state)
+    return state.visible, changed_paths, runs
+
+def get_requested_paths(maze):
+    """Return the IDs of the paths the request's query parameters ask to show"""
     # Check if reveal_all parameter is present
     reveal_all = request.args.get('reveal_all', '').lower() in ['true', '1', 'yes', 'y']
     
     if reveal_all:
         # Make all paths visible
-        for path_id in maze.paths:
-            maze.paths[path_id].visible = True
+        visible_ids = set(maze.paths)
     else:
         # Make all paths hidden by default
-        for path_id in maze.paths:
-            maze.paths[path_id].visible = False
+        visible_ids = set()
         
         # Check for path parameters in the URL
         visible_paths = request.args.getlist('path')
@@ -467,34 +1512,108 @@ def index():
                 
                 # First check if it's a direct path ID
                 if path_name in maze.paths:
-                    maze.paths[path_name].visible = True
+                    visible_ids.add(path_name)
                 # Then check if it's a path label
                 elif path_name_lower in maze.label_to_id:
-                    path_id = maze.label_to_id[path_name_lower]
-                    maze.paths[path_id].visible = True
+                    visible_ids.add(maze.label_to_id[path_name_lower])
     
-    # Redraw the maze with updated visibility
-    maze.reset_grid_and_draw_paths()
+    return visible_ids
+
+def events_url(channel):
+    """Return the /events URL for a channel of the maze this request is showing"""
+    seed = request_seed()
+    if seed is None:
+        return url_for('stream_events', channel=channel.name)
+    return url_for('stream_events', channel=channel.name, seed=seed)
+
+def render_maze_page(maze):
+    """Render the maze page for the paths requested in the query string"""
+    # A channel page shows the channel's shared view and then follows /events
+    channel = get_channel(maze)
+    if channel is not None:
+        snapshot = channel.snapshot()
+        state = maze.new_state(snapshot['visible'])
+    else:
+        # This request's view; the grid is only drawn on a cache miss
+        state = maze.new_state(get_requested_paths(maze))
+        save_session_state(state)
+    
+    # Clients that read data-x/data-y can ask for one element per cell
+    per_cell = request.args.get('per_cell', '').lower() in ['true', '1', 'yes', 'y']
+    
+    # Large mazes can be shown as an image plus an overlay instead of one element per run
+    image_format = request.args.get('image')
+    if image_format not in IMAGE_TYPES:
+        image_format = None
     
-    return render_template('index.html', maze_html=maze.to_html(), paths_info=maze.get_path_info())
+    # The page only depends on the maze and the visibility combination
+    etag = maze.etag(state, per_cell)
+    if image_format:
+        etag = f'{etag}-{image_format}'
+    if channel is not None:
+        # Channel names are arbitrary text, which an ETag cannot always hold
+        channel_tag = hashlib.blake2b(channel.name.encode('utf-8'), digest_size=8).hexdigest()
+        etag = f'{etag}-{channel_tag}-{snapshot["version"]}'
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        return response
+    
+    image_urls = None
+    if image_format:
+        maze_html = None
+        query = {'token': maze.token, 'path': sorted(state.visible)}
+        if request_seed() is not None:
+            query['seed'] = request_seed()
+        image_urls = {
+            'image': url_for('maze_image', image_format=image_format, **query),
+            'overlay': url_for('maze_overlay', **query),
+            'size': maze.size * CELL_PX
+        }
+    else:
+        maze_html = maze.cached_html(state, per_cell)
+    paths_info = maze.cached_path_info(state)
+    with instrument.phase('template'):
+        page = render_template('index.html', maze_html=maze_html, paths_info=paths_info, image_urls=image_urls,
+                               channel=channel.name if channel else None,
+                               version=snapshot['version'] if channel else None,
+                               events_url=events_url(channel) if channel else None)
+    response = make_response(page)
+    response.set_etag(etag)
+    return response
+
+@app.route('/')
+def index():
+    return render_maze_page(get_request_maze())
+
+@app.route('/maze/<int:seed>')
+def maze_page(seed):
+    return render_maze_page(get_request_maze(seed))
+
+@app.route('/new')
+def new_maze():
+    # Serve a pregenerated maze so this never waits for generation
+    return redirect(url_for('maze_page', seed=get_pool().take_new_seed()))
 
 @app.route('/toggle/<path_id_or_label>')
 def toggle_path(path_id_or_label):
-    global maze
-    if maze is None:
-        maze = Maze()
+    maze = get_request_maze()
     
-    success, path_id = maze.toggle_path(path_id_or_label)
+    path_id = maze.resolve_path(path_id_or_label)
+    success = path_id is not None
     
     # Return path info after toggling
     path_info = None
-    if success and path_id in maze.paths:
+    if success:
+        visible, _, _ = update_visibility(maze, [(path_id, None)])
         path = maze.paths[path_id]
         path_info = {
             "id": path_id,
             "label": path.label,
-            "visible": path.visible
+            "visible": path_id in visible
         }
+    else:
+        path_id = path_id_or_label
     
     return jsonify({
         "success": success,
@@ -504,32 +1623,92 @@ def toggle_path(path_id_or_label):
 
 @app.route('/paths')
 def get_paths():
-    global maze
-    if maze is None:
-        maze = Maze()
+    maze = get_request_maze()
     
-    return jsonify(maze.get_path_info())
+    return jsonify(maze.cached_path_info(get_visible_state(maze)))
 
 @app.route('/toggle-all', methods=['POST'])
 def toggle_all_paths():
-    global maze
-    if maze is None:
-        maze = Maze()
+    maze = get_request_maze()
     
     visible = request.json.get('visible', False)
     
     # Toggle all paths to the specified visibility
-    for path_id in maze.paths:
-        maze.paths[path_id].visible = visible
+    if get_channel(maze) is not None:
+        update_visibility(maze, [(path_id, bool(visible)) for path_id in maze.paths])
+    else:
+        save_session_state(maze.new_state(maze.paths if visible else ()))
     
-    maze.reset_grid_and_draw_paths()
     return jsonify({"success": True, "visible": visible})
 
+@app.route('/toggle-batch', methods=['POST'])
+def toggle_batch():
+    maze = get_request_maze()
+    
+    # {"paths": [...], "visible": true/false (omit to flip each), "diff": true}
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"success": False, "error": "the body must be a JSON object"}), 400
+    names = data.get('paths', [])
+    if isinstance(names, str) or not isinstance(names, list):
+        return jsonify({"success": False, "error": "paths must be a list of path IDs or labels"}), 400
+    visible = data.get('visible')
+    if visible is not None and not isinstance(visible, bool):
+        return jsonify({"success": False, "error": "visible must be true, false or null"}), 400
+    
+    # Resolve IDs and labels, keeping track of anything unknown
+    changes = []
+    unknown = []
+    for name in names:
+        path_id = maze.resolve_path(str(name))
+        if path_id is None:
+            unknown.append(name)
+        else:
+            changes.append((path_id, visible))
+    
+    visible_ids, changed_paths, runs = update_visibility(maze, changes, diff=True)
+    
+    result = {
+        "success": not unknown,
+        "unknown": unknown,
+        "changed": changed_paths,
+        "cells": runs
+    }
+    # Diff-only clients skip the full path listing
+    if not data.get('diff'):
+        result["paths"] = maze.cached_path_info(maze.new_state(visible_ids))
+    return jsonify(result)
+
+@app.route('/events')
+def stream_events():
+    maze = get_request_maze()
+    channel = get_channel(maze, request.args.get('channel', 'default'))
+    
+    # A snapshot event first, then a diff event per change and a maze event on regeneration
+    response = Response(channel.stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Stop proxies from holding events back
+    return response
+
+@app.route('/regenerate', methods=['POST'])
+def regenerate_maze():
+    global maze
+    old_maze = get_maze()
+    new_maze = offload(Maze, old_maze.size)
+    if shared_store is not None:
+        # Every worker switches over (and moves its channels) on its next get_maze()
+        shared_store.publish(new_maze)
+        return jsonify({"success": True, "maze": get_maze().token})
+    with maze_lock:
+        maze = new_maze
+    
+    # Viewers of the old maze's channels are moved over and told to reload
+    channels.move(old_maze, new_maze)
+    return jsonify({"success": True, "maze": new_maze.token})
+
 @app.route('/labels')
 def get_path_labels():
-    global maze
-    if maze is None:
-        maze = Maze()
+    maze = get_request_maze()
     
     # Create a dictionary mapping labels to path IDs
     labels = {}
@@ -538,5 +1717,210 @@ def get_path_labels():
     
     return jsonify(labels)
 
+def set_cache_control(response, maze):
+    """Set Cache-Control: a URL pinned to the maze token never changes, so it can be cached for good"""
+    if request.args.get('token') == maze.token:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'public, max-age=60'
+
+@app.route('/export')
+def export_maze():
+    maze = get_request_maze()
+    
+    encoding = 'packed' if request.args.get('encoding') == 'packed' else 'rle'
+    content_encoding = choose_content_encoding(request.headers.get('Accept-Encoding', ''))
+    
+    # Each representation has its own strong ETag
+    etag = f'{maze.token}-{encoding}-{content_encoding or "identity"}'
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        key = ('export', encoding, content_encoding)
+        payload = maze.render_cache.get(key)
+        if payload is None:
+            payload = json.dumps(maze.export(encoding), separators=(',', ':')).encode('utf-8')
+            payload = compress(payload, content_encoding)
+            maze.render_cache.put(key, payload)
+        response = make_response(payload)
+        response.content_type = 'application/json'
+        if content_encoding:
+            response.headers['Content-Encoding'] = content_encoding
+    
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    set_cache_control(response, maze)
+    return response
+
+def image_response(layer, image_format):
+    """Serve a rendered image of the requested paths, cached in memory and on disk"""
+    maze = get_request_maze()
+    state = maze.new_state(get_requested_paths(maze))
+    
+    etag = f'{maze.token}-{state.mask:x}-{layer}-{image_format}'
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        key = ('image', layer, image_format, state.mask)
+        data = maze.render_cache.get(key)
+        if data is None:
+            # Images of a maze and visibility never change, so they survive restarts on disk
+            name = f'{maze.token}-{state.mask:x}-{layer}.{image_format}'
+            data = get_image_cache().get(name)
+            if data is None:
+                data = offload_maze(render_image, maze, sorted(state.visible), layer, image_format)
+                get_image_cache().put(name, data)
+            maze.render_cache.put(key, data)
+        response = make_response(data)
+        response.content_type = IMAGE_TYPES[image_format]
+    
+    response.set_etag(etag)
+    set_cache_control(response, maze)
+    return response
+
+@app.route('/image.<any(png, svg):image_format>')
+def maze_image(image_format):
+    return image_response('image', image_format)
+
+@app.route('/overlay.svg')
+def maze_overlay():
+    return image_response('overlay', 'svg')
+
+@app.route('/tile/<int:z>/<int:x>/<int:y>', defaults={'tile_format': 'html'})
+@app.route('/tile/<int:z>/<int:x>/<int:y>.<any(html, png):tile_format>')
+def maze_tile(z, x, y, tile_format):
+    maze = get_request_maze()
+    bounds = maze.tile_bounds(z, x, y)
+    if bounds is None:
+        return jsonify({"success": False, "error": "tile is outside the maze"}), 404
+    
+    # Only the paths reaching this tile are part of its key, so toggling
+    # any other path leaves the tile (and its ETag) unchanged
+    state = maze.new_state(get_requested_paths(maze))
+    mask = state.mask & maze.tile_paths_mask(bounds)
+    
+    etag = f'{maze.token}-{z}-{x}-{y}-{mask:x}-{tile_format}'
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        key = ('tile', bounds, mask, tile_format)
+        data = maze.render_cache.get(key)
+        if data is None:
+            visible = maze.state_from_mask(mask).visible
+            if tile_format == 'png':
+                data = maze.tile_png(visible, bounds)
+            else:
+                data = maze.tile_html(visible, bounds)
+            maze.render_cache.put(key, data)
+        response = make_response(data)
+        response.content_type = TILE_TYPES[tile_format]
+    
+    response.set_etag(etag)
+    set_cache_control(response, maze)
+    return response
+
+@app.route('/solve')
+def solve_maze():
+    maze = get_request_maze()
+    
+    # Solve with every path visible unless the query picks some
+    if 'path' in request.args or 'reveal_all' in request.args:
+        state = maze.new_state(get_requested_paths(maze))
+    else:
+        state = maze.new_state()
+    include_route = request.args.get('route', '').lower() in ['true', '1', 'yes', 'y']
+    
+    key = ('solve', state.mask, include_route)
+    result = maze.render_cache.get(key)
+    if result is None:
+        result = offload_maze(solve_visible, maze, sorted(state.visible), include_route)
+        maze.render_cache.put(key, result)
+    return jsonify(result)
+
+@app.route('/graph')
+def get_path_graph():
+    maze = get_request_maze()
+    index = maze.segment_index
+    
+    # Use every path unless the query picks some
+    if 'path' in request.args or 'reveal_all' in request.args:
+        visible_ids = get_requested_paths(maze)
+    else:
+        visible_ids = set(maze.paths)
+    
+    result = {
+        'edges': index.path_graph(),
+        'components': index.components(visible_ids)
+    }
+    
+    # Optional reachability query between two paths (IDs, labels, or entrance/exit/hub)
+    start, goal = request.args.get('from'), request.args.get('to')
+    if start and goal:
+        start = maze.resolve_path(start) or start.lower()
+        goal = maze.resolve_path(goal) or goal.lower()
+        result['reachable'] = index.can_reach(start, goal, visible_ids)
+    
+    return jsonify(result)
+
+@app.route('/metrics')
+def get_metrics():
+    # Phase and route timings, plus the cache and pool counters
+    lines = [instrument.render_metrics()]
+    if maze is not None:
+        for name, value in maze.render_cache.stats().items():
+            lines.append(f'maze_render_cache_{name} {value}\n')
+    if maze_pool is not None:
+        for name, value in maze_pool.stats().items():
+            lines.append(f'maze_pool_{name} {value}\n')
+    response = make_response(''.join(lines))
+    response.content_type = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
+
+@app.route('/cache-stats')
+def get_cache_stats():
+    return jsonify(get_request_maze().render_cache.stats())
+
+@app.route('/pool-stats')
+def get_pool_stats():
+    return jsonify(get_pool().stats())
+
+@app.cli.command('build-snapshot')
+@click.argument('path', default=lambda: os.path.join(app.instance_path, 'maze.snapshot'))
+@click.option('--size', default=64, type=click.IntRange(MIN_SIZE, MAX_SIZE), help=f'Maze size ({MIN_SIZE}-{MAX_SIZE})')
+@click.option('--seed', type=int, help='Seed for a reproducible maze (random if omitted)')
+@click.option('--hub-paths', type=click.IntRange(MIN_HUB_PATHS, MAX_HUB_PATHS),
+              help=f'Paths converging on the hub ({MIN_HUB_PATHS}-{MAX_HUB_PATHS})')
+@click.option('--classic', is_flag=True, help='Use the classic layout of the default maze instead of 18-24 hub paths')
+def build_snapshot(path, size, seed, hub_paths, classic):
+    """Write a maze snapshot to load at startup with MAZE_SNAPSHOT=PATH"""
+    if classic and hub_paths is not None:
+        raise click.UsageError('--hub-paths cannot be combined with --classic')
+    start = time.perf_counter()
+    if classic:
+        snapshot_maze = Maze(size, seed=seed)
+    else:
+        snapshot_maze = generate_maze(size, seed=seed, hub_paths=hub_paths)
+    data = snapshot_maze.to_buffer()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+    click.echo(f'Wrote {path}: maze {snapshot_maze.token}, {len(data)} bytes in {time.perf_counter() - start:.3f}s')
+
+def warm_up():
+    """Do the work of the first request at boot: load the shared maze, compile the page template
+    and start pregenerating the seeded mazes handed out by /new
+    
+    Called when a server starts rather than on import, so CLI commands
+    such as build-snapshot do not load the maze they may be about to write.
+    """
+    get_maze()
+    app.jinja_env.get_template('index.html')
+    get_pool()
+
 if __name__ == '__main__':
+    # With the reloader, only the child process that serves requests warms up
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        warm_up()
     app.run(debug=True, port=5002) 
\ No newline at end of file
@@ -0,0 +1,184 @@
+"""ASGI entry point for the maze app
+
+Run with any ASGI server, for example:
+    uvicorn asgi:application --port 5002
+
+Cheap endpoints (path listings, labels, toggles and counters) are answered
+directly on the event loop unless they use a shared channel. Every other
+request runs in a thread so the loop stays free, and each event stream
+gets a thread of its own. The CPU-heavy work inside requests (maze
+generation, rendering and solving) is sent to a ProcessPoolExecutor
+through app.offload(), so large mazes use every core instead of blocking
+other clients. Each worker keeps the mazes it has been sent, so a maze is
+only pickled once per worker. Set MAZE_WORKERS to the number of worker
+processes (defaults to the CPU count) and MAZE_THREADS to the number of
+request threads.
+"""
+import asyncio
+import io
+import multiprocessing
+import os
+import sys
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import app as maze_app
+
+# Paths served directly on the event loop once the shared maze exists; they
+# never generate or render a grid
+CHEAP_PATHS = {'/paths', '/labels', '/toggle-all', '/cache-stats', '/pool-stats', '/metrics'}
+CHEAP_PREFIXES = ('/toggle/',)
+
+# Threads that run the Flask app for everything else
+request_threads = ThreadPoolExecutor(max_workers=int(os.environ.get('MAZE_THREADS', 32)), thread_name_prefix='maze-request')
+
+def is_cheap(scope):
+    """Check whether a request can be answered on the event loop"""
+    if not (scope['path'] in CHEAP_PATHS or scope['path'].startswith(CHEAP_PREFIXES)):
+        return False
+    query = urllib.parse.parse_qs(scope['query_string'].decode('latin-1'))
+    # Seeded mazes or the first use of the shared maze may still need generating, and
+    # channels draw their grid on first use and lock the shared store
+    return maze_app.maze is not None and 'seed' not in query and 'channel' not in query
+
+def start_workers():
+    """Start the worker processes used by app.offload()"""
+    if maze_app.executor is None:
+        workers = int(os.environ.get('MAZE_WORKERS', 0)) or os.cpu_count()
+        # Spawned workers do not inherit the request threads or locks of this process
+        maze_app.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+def stop_workers():
+    executor, maze_app.executor = maze_app.executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def build_environ(scope, body):
+    """Translate an ASGI HTTP scope and body into a WSGI environ"""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+            key = name
+        else:
+            key = f'HTTP_{name}'
+        # Repeated headers are joined, as WSGI servers do
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    # The body has already been read in full (chunked uploads have no length header)
+    environ['CONTENT_LENGTH'] = str(len(body))
+    return environ
+
+def call_wsgi(environ):
+    """Run the Flask app; returns (status, headers, body iterator)"""
+    response = {}
+    
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+    
+    body = maze_app.app.wsgi_app(environ, start_response)
+    return response['status'], response['headers'], body
+
+async def read_body(receive):
+    """Read the whole request body"""
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+async def handle_http(scope, receive, send):
+    loop = asyncio.get_running_loop()
+    environ = build_environ(scope, await read_body(receive))
+    cheap = is_cheap(scope)
+    
+    # Runs a blocking call inline for cheap requests, else in a request thread
+    async def run(func, *args):
+        if cheap:
+            return func(*args)
+        return await loop.run_in_executor(request_threads, func, *args)
+    
+    status, headers, body = await run(call_wsgi, environ)
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    
+    # Event streams wait between chunks for as long as the client stays, so
+    # each gets a thread of its own instead of holding a request thread
+    stream_thread = None
+    if any(name == b'content-type' and value.startswith(b'text/event-stream') for name, value in headers):
+        stream_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix='maze-stream')
+        
+        async def run(func, *args):
+            return await loop.run_in_executor(stream_thread, func, *args)
+    
+    # Notice clients that go away, so endless streams stop at their next chunk
+    disconnected = asyncio.Event()
+    
+    async def watch_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        disconnected.set()
+    
+    watcher = asyncio.create_task(watch_disconnect())
+    chunks = iter(body)
+    try:
+        while not disconnected.is_set():
+            # Streamed responses (like /events) block between chunks
+            chunk = await run(next, chunks, None)
+            if chunk is None:
+                await send({'type': 'http.response.body', 'body': b''})
+                break
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    finally:
+        watcher.cancel()
+        if hasattr(body, 'close'):
+            await run(body.close)
+        if stream_thread is not None:
+            stream_thread.shutdown(wait=False)
+
+async def handle_lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            start_workers()
+            # Load or generate the shared maze, compile the page and start filling the
+            # pool of seeded mazes before taking requests
+            await asyncio.get_running_loop().run_in_executor(request_threads, maze_app.warm_up)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            stop_workers()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def application(scope, receive, send):
+    """The ASGI application"""
+    if scope['type'] == 'lifespan':
+        await handle_lifespan(receive, send)
+    elif scope['type'] == 'http':
+        # Servers without lifespan support start the workers on the first request
+        start_workers()
+        await handle_http(scope, receive, send)
+    else:
+        raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
@@ -0,0 +1,202 @@
+"""Benchmarks for maze generation, redraw, toggle, rendering and the Flask routes
+
+Run with:
+    python bench.py                        # sizes 64, 256 and 1024
+    python bench.py --save .benchmarks/baseline.json
+    python bench.py --compare .benchmarks/baseline.json
+    python bench.py --startup              # cold start with and without a snapshot
+
+Each benchmark reports the best and mean time per call. Saved results can
+be compared against later runs to spot regressions.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import timeit
+import tracemalloc
+
+import app
+from app import Maze, generate_maze
+
+DEFAULT_SIZES = [64, 256, 1024]
+
+# Redraws used to check that per-path storage does not grow
+REDRAW_ROUNDS = 100
+
+def time_call(func, repeat):
+    """Return (best, mean) seconds per call of func"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    times = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return min(times), sum(times) / len(times)
+
+def peak_memory(func):
+    """Return the peak memory (bytes) allocated while running func once"""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def path_cells_size(maze):
+    """Total number of cells stored on the maze's paths"""
+    return sum(len(path.cells) for path in maze.paths.values())
+
+def maze_benchmarks(size):
+    """Return (name, callable) pairs for the Maze operations at one size"""
+    maze = Maze(size)
+    state = maze.new_state()
+    state.cells  # Draw the grid up front so only the operation is timed
+    return [
+        ('Maze.__init__', lambda: Maze(size)),
+        ('generate_maze', lambda: generate_maze(size, seed=1)),
+        ('reset_grid_and_draw_paths', state.reset_grid_and_draw_paths),
+        ('toggle_path (id)', lambda: state.toggle_path('main_left')),
+        ('toggle_path (label)', lambda: state.toggle_path('Alpha')),
+        ('to_html', lambda: maze.to_html(state)),
+        ('to_html (per_cell)', lambda: maze.to_html(state, per_cell=True)),
+        ('get_path_info', lambda: maze.get_path_info(state)),
+    ]
+
+def route_benchmarks(size):
+    """Return (name, callable) pairs for the Flask routes at one size"""
+    app.maze = Maze(size)
+    client = app.app.test_client()
+    client.get('/')  # Start a session
+    
+    def uncached_page():
+        # Drop rendered pages first so every call draws the grid and builds the HTML
+        app.maze.render_cache.clear()
+        return client.get('/?path=alpha')
+    
+    return [
+        ('GET /', uncached_page),
+        ('GET / (cached)', lambda: client.get('/?path=alpha')),
+        ('GET /toggle/<id>', lambda: client.get('/toggle/main_left')),
+        ('POST /toggle-all', lambda: client.post('/toggle-all', json={'visible': True})),
+        ('GET /paths', lambda: client.get('/paths')),
+        ('GET /labels', lambda: client.get('/labels')),
+    ]
+
+def memory_benchmarks(size):
+    """Return memory figures for one size"""
+    maze = Maze(size)
+    state = maze.new_state()
+    before = path_cells_size(maze)
+    for _ in range(REDRAW_ROUNDS):
+        state.reset_grid_and_draw_paths()
+    return {
+        'generate_peak_bytes': peak_memory(lambda: Maze(size)),
+        'render_peak_bytes': peak_memory(lambda: maze.to_html(state)),
+        'path_cells_before_redraws': before,
+        'path_cells_after_redraws': path_cells_size(maze),
+    }
+
+# Run in a fresh interpreter: import the app and serve the first page
+STARTUP_SCRIPT = """
+import os
+import time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+if os.environ.get('MAZE_SNAPSHOT'):
+    app.warm_up()  # What a server does at startup
+else:
+    app.maze = app.generate_maze({size}, seed=1)  # What the first request would otherwise build
+app.app.test_client().get('/?reveal_all=1')
+print(imported - start, time.perf_counter() - start)
+"""
+
+def startup_time(size, snapshot=None, repeat=3):
+    """Best wall time for a new process to import the app, and to serve its first page"""
+    env = dict(os.environ)
+    env.pop('MAZE_SNAPSHOT', None)
+    if snapshot:
+        env['MAZE_SNAPSHOT'] = snapshot
+    script = STARTUP_SCRIPT.format(size=size)
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', script], env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True).stdout
+        times.append(tuple(float(value) for value in output.split()[-2:]))
+    return min(times, key=lambda pair: pair[1])
+
+def startup_benchmarks(sizes, repeat):
+    """Compare cold starts that generate the maze with ones that load a snapshot"""
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            snapshot = os.path.join(directory, f'maze-{size}.snapshot')
+            with open(snapshot, 'wb') as f:
+                f.write(generate_maze(size, seed=1).to_buffer())
+            for mode, path in (('generate', None), ('snapshot', snapshot)):
+                imported, first_page = startup_time(size, path, repeat=repeat)
+                results.setdefault(str(size), {})[mode] = {'import': imported, 'first_page': first_page}
+                print(f'{"startup (" + mode + ")":<28} {size:>5}  import {imported * 1e3:>9.1f} ms  '
+                      f'first page {first_page * 1e3:>9.1f} ms  after import {(first_page - imported) * 1e3:>9.1f} ms')
+    return results
+
+def run(sizes, repeat):
+    """Run every benchmark and return the results"""
+    results = {'timings': {}, 'memory': {}}
+    for size in sizes:
+        for name, func in maze_benchmarks(size) + route_benchmarks(size):
+            best, mean = time_call(func, repeat)
+            results['timings'].setdefault(name, {})[str(size)] = {'best': best, 'mean': mean}
+            print(f'{name:<28} {size:>5}  best {best * 1e6:>12.1f} us  mean {mean * 1e6:>12.1f} us')
+        memory = memory_benchmarks(size)
+        results['memory'][str(size)] = memory
+        print(f'{"memory":<28} {size:>5}  generate peak {memory["generate_peak_bytes"] / 1024:.0f} KiB, '
+              f'render peak {memory["render_peak_bytes"] / 1024:.0f} KiB, '
+              f'Path.cells {memory["path_cells_before_redraws"]} -> {memory["path_cells_after_redraws"]} '
+              f'after {REDRAW_ROUNDS} redraws')
+    return results
+
+def compare(results, reference, threshold):
+    """Print the change against saved results; returns True if nothing regressed"""
+    ok = True
+    print()
+    for name, by_size in results.get('timings', {}).items():
+        for size, timing in by_size.items():
+            old = reference.get('timings', {}).get(name, {}).get(size)
+            if not old:
+                continue
+            ratio = timing['best'] / old['best']
+            flag = ''
+            if ratio > threshold:
+                flag = '  REGRESSION'
+                ok = False
+            print(f'{name:<28} {size:>5}  {ratio:6.2f}x{flag}')
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='maze sizes to benchmark')
+    parser.add_argument('--repeat', type=int, default=5, help='timing repeats per benchmark')
+    parser.add_argument('--save', help='write results to this JSON file')
+    parser.add_argument('--compare', help='compare against results saved with --save')
+    parser.add_argument('--threshold', type=float, default=1.2, help='slowdown ratio reported as a regression')
+    parser.add_argument('--startup', action='store_true', help='only measure cold start times')
+    args = parser.parse_args()
+    
+    if args.startup:
+        results = {'startup': startup_benchmarks(args.sizes, args.repeat)}
+    else:
+        results = run(args.sizes, args.repeat)
+    
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or '.', exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            reference = json.load(f)
+        if not compare(results, reference, args.threshold):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+# Seconds between keep-alive comments on idle streams
+HEARTBEAT_SECONDS = 15
+
+# Seconds between checks of the shared store for changes made by other processes
+POLL_SECONDS = 1
+
+# Events buffered per subscriber before a slow client is dropped
+SUBSCRIBER_QUEUE_SIZE = 256
+
+def format_event(event, data):
+    """Format one Server-Sent Event"""
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+class Channel:
+    """A visibility state shared by every viewer of a channel
+    
+    Changes are applied under a lock, bump the channel version, and are
+    pushed to every subscriber as compact cell-run diffs. With a shared
+    store the channel's mask and version live there, so workers in other
+    processes see the same state and catch up on each other's changes.
+    """
+    def __init__(self, name, state, store=None, refresh=None):
+        self.name = name
+        self.state = state
+        self.version = 0
+        self.lock = threading.Lock()
+        self.subscribers = []
+        self.store = store  # SharedStore holding the mask, or None to keep it in this process
+        self.refresh = refresh  # Called while streaming to pick up a maze regenerated elsewhere
+    
+    @property
+    def maze(self):
+        return self.state.maze
+    
+    def snapshot(self):
+        """Return the current maze token, version and visible paths"""
+        self.sync()
+        with self.lock:
+            return {
+                'maze': self.maze.token,
+                'version': self.version,
+                'visible': sorted(self.state.visible)
+            }
+    
+    def changes_to(self, mask):
+        """Changes that bring the state to a stored mask (None means every path visible)"""
+        target = set(self.maze.paths) if mask is None else self.maze.state_from_mask(mask).visible
+        return [(path_id, path_id in target) for path_id in self.maze.paths]
+    
+    def change(self, changes, version):
+        """Apply changes and publish them as the given version (caller holds the lock)
+        
+        Returns (visible path IDs, changed path IDs, changed cell runs).
+        """
+        changed_paths, changed_cells = self.state.apply_changes(changes)
+        runs = self.state.cell_runs(changed_cells)
+        if changed_paths:
+            self.version = version
+            self.publish('diff', {
+                'version': version,
+                'changed': changed_paths,
+                'visible': sorted(self.state.visible),
+                'cells': runs
+            })
+        return set(self.state.visible), changed_paths, runs
+    
+    def apply(self, changes):
+        """Apply visibility changes and publish the resulting diff
+        
+        Returns (visible path IDs, changed path IDs, changed cell runs).
+        """
+        if self.store is None:
+            with self.lock:
+                return self.change(changes, self.version + 1)
+        
+        result = None
+        
+        def update(version, mask):
+            # Runs under the store's lock: catch up with other workers, then apply
+            nonlocal result
+            with self.lock:
+                result = self.change(self.changes_to(mask) + list(changes), version + 1)
+                return self.state.mask if result[1] else None
+        
+        self.store.update_channel(self.maze.token, self.name, update)
+        return result
+    
+    def sync(self):
+        """Catch up with changes other processes made through the shared store"""
+        if self.store is None:
+            return
+        version, mask = self.store.read_channel(self.maze.token, self.name)
+        with self.lock:
+            if version > self.version:
+                self.change(self.changes_to(mask), version)
+                self.version = version
+    
+    def reset(self, maze):
+        """Switch the channel to a new maze and tell subscribers"""
+        # The store's lock is always taken before self.lock (see apply), never inside it
+        if self.store is not None:
+            version, mask = self.store.read_channel(maze.token, self.name)
+        with self.lock:
+            if self.store is None:
+                self.state = maze.new_state()
+                self.version += 1
+            else:
+                self.state = maze.new_state() if mask is None else maze.state_from_mask(mask)
+                self.version = version
+            self.publish('maze', {
+                'version': self.version,
+                'maze': maze.token,
+                'visible': sorted(self.state.visible)
+            })
+    
+    def publish(self, event, data):
+        """Queue an event for every subscriber (caller holds the lock)"""
+        message = format_event(event, data)
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # A client that cannot keep up is dropped; it will reconnect.
+                # Its backlog is discarded so the end marker fits without blocking
+                self.subscribers.remove(subscriber)
+                try:
+                    while True:
+                        subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                subscriber.put_nowait(None)
+    
+    def subscribe(self):
+        """Register a new subscriber and return its queue"""
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self.lock:
+            self.subscribers.append(subscriber)
+        return subscriber
+    
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+    
+    def stream(self):
+        """Yield Server-Sent Events: a snapshot, then diffs as they happen"""
+        subscriber = self.subscribe()
+        # Changes made in other processes only show up by polling the store
+        timeout = HEARTBEAT_SECONDS if self.store is None else POLL_SECONDS
+        try:
+            yield format_event('snapshot', self.snapshot())
+            last_sent = time.monotonic()
+            while True:
+                try:
+                    message = subscriber.get(timeout=timeout)
+                except queue.Empty:
+                    if self.store is not None:
+                        if self.refresh is not None:
+                            self.refresh()
+                        self.sync()
+                    if time.monotonic() - last_sent >= HEARTBEAT_SECONDS:
+                        last_sent = time.monotonic()
+                        yield ': keep-alive\n\n'
+                    continue
+                if message is None:
+                    return
+                last_sent = time.monotonic()
+                yield message
+        finally:
+            self.unsubscribe(subscriber)
+
+class ChannelRegistry:
+    """Channels by maze token and name, with idle channels evicted first"""
+    def __init__(self, capacity=256, store=None, refresh=None):
+        self.capacity = capacity
+        self.store = store  # Passed on to every channel
+        self.refresh = refresh
+        self.channels = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def get(self, maze, name):
+        """Return the channel for a maze and name, creating it if needed"""
+        key = (maze.token, name)
+        with self.lock:
+            channel = self.channels.get(key)
+            if channel is None:
+                channel = self.channels[key] = Channel(name, maze.new_state(), self.store, self.refresh)
+                self.evict()
+            self.channels.move_to_end(key)
+            return channel
+    
+    def evict(self):
+        """Drop the least recently used channels nobody is watching (caller holds the lock)"""
+        for key in list(self.channels):
+            if len(self.channels) <= self.capacity:
+                break
+            if not self.channels[key].subscribers:
+                del self.channels[key]
+    
+    def move(self, old_maze, new_maze):
+        """Move every channel of old_maze onto new_maze, notifying subscribers"""
+        with self.lock:
+            moved = [(key, channel) for key, channel in self.channels.items() if key[0] == old_maze.token]
+            for key, channel in moved:
+                del self.channels[key]
+                self.channels[(new_maze.token, channel.name)] = channel
+        for key, channel in moved:
+            channel.reset(new_maze)
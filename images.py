@@ -0,0 +1,67 @@
+import os
+import struct
+import threading
+import zlib
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# PNG colour type for palette-based images
+INDEXED_COLOR = 3
+
+def png_chunk(kind, data):
+    """Return one PNG chunk: length, type, data and CRC"""
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+def encode_png(width, height, scanlines, palette, bit_depth=8):
+    """Encode an indexed-colour PNG
+    
+    scanlines holds every row already packed to bit_depth, each preceded
+    by its filter byte. palette is a list of "#rrggbb" colours.
+    """
+    header = struct.pack('>IIBBBBB', width, height, bit_depth, INDEXED_COLOR, 0, 0, 0)
+    colors = b''.join(bytes.fromhex(color.lstrip('#')) for color in palette)
+    return (PNG_SIGNATURE + png_chunk(b'IHDR', header) + png_chunk(b'PLTE', colors)
+            + png_chunk(b'IDAT', zlib.compress(scanlines, 9)) + png_chunk(b'IEND', b''))
+
+class ImageCache:
+    """Rendered images on disk, named by maze token and visibility mask
+    
+    Files are written atomically, so concurrent workers can share the
+    directory, and the oldest are removed beyond max_files.
+    """
+    def __init__(self, cache_dir, max_files=1000):
+        self.cache_dir = cache_dir
+        self.max_files = max_files
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    def path_for(self, name):
+        return os.path.join(self.cache_dir, name)
+    
+    def get(self, name):
+        """Return a cached image, or None"""
+        try:
+            with open(self.path_for(name), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+    
+    def put(self, name, data):
+        """Write an image to the cache"""
+        path = self.path_for(name)
+        temp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        self.prune()
+    
+    def prune(self):
+        """Remove the oldest images beyond max_files"""
+        entries = [entry for entry in os.scandir(self.cache_dir) if not entry.name.endswith('.tmp')]
+        if len(entries) <= self.max_files:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_files]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
@@ -0,0 +1,179 @@
+"""Opt-in timing for maze phases and Flask routes
+
+Set MAZE_INSTRUMENT=1 (or call enable()) to record wall time per phase and
+per route. Per-request timings are sent in a Server-Timing header and
+totals are available in Prometheus text format from render_metrics().
+With instrumentation off, phase() returns a shared no-op context manager
+and the request hooks return immediately.
+"""
+import cProfile
+import functools
+import os
+import threading
+import time
+
+from flask import g, has_request_context, request
+
+enabled = os.environ.get('MAZE_INSTRUMENT', '').lower() in ['true', '1', 'yes', 'y']
+
+# Where ?profile=1 writes cProfile dumps (defaults to the app's instance folder)
+profile_dir = os.environ.get('MAZE_PROFILE_DIR')
+
+# Only one request can be profiled at a time
+profile_lock = threading.Lock()
+
+METRIC_HELP = {
+    'maze_phase_seconds': 'Wall time spent in each maze phase',
+    'maze_request_seconds': 'Wall time spent handling each route',
+    'maze_response_bytes': 'Size of the response body for each route',
+}
+
+class Registry:
+    """Running count and sum of observations per metric and label set"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}
+    
+    def observe(self, metric, labels, value):
+        """Record one observation"""
+        key = (metric, tuple(sorted(labels.items())))
+        with self.lock:
+            count, total = self.series.get(key, (0, 0.0))
+            self.series[key] = (count + 1, total + value)
+    
+    def clear(self):
+        with self.lock:
+            self.series.clear()
+    
+    def render(self):
+        """Return all series in Prometheus text exposition format"""
+        with self.lock:
+            series = sorted(self.series.items())
+        lines = []
+        seen = set()
+        for (metric, labels), (count, total) in series:
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f'# HELP {metric} {METRIC_HELP.get(metric, metric)}')
+                lines.append(f'# TYPE {metric} summary')
+            label_text = ','.join(f'{name}="{escape_label(value)}"' for name, value in labels)
+            lines.append(f'{metric}_count{{{label_text}}} {count}')
+            lines.append(f'{metric}_sum{{{label_text}}} {total:.9g}')
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+def escape_label(value):
+    """Escape a Prometheus label value"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def enable(on=True):
+    """Turn instrumentation on or off at runtime"""
+    global enabled
+    enabled = on
+
+class NullTimer:
+    """Context manager that does nothing, used while instrumentation is off"""
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        return False
+
+NULL_TIMER = NullTimer()
+
+class PhaseTimer:
+    """Context manager that records the wall time of one phase"""
+    def __init__(self, name):
+        self.name = name
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc_info):
+        record_phase(self.name, time.perf_counter() - self.start)
+        return False
+
+def phase(name):
+    """Time a block as a named phase (a no-op unless instrumentation is on)"""
+    if not enabled:
+        return NULL_TIMER
+    return PhaseTimer(name)
+
+def timed(name):
+    """Decorator form of phase()"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            with PhaseTimer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record_phase(name, seconds):
+    """Add a phase timing to the totals and to the current request"""
+    registry.observe('maze_phase_seconds', {'phase': name}, seconds)
+    if has_request_context():
+        timings = g.setdefault('phase_timings', {})
+        timings[name] = timings.get(name, 0.0) + seconds
+
+def before_request():
+    if not enabled:
+        return
+    g.request_start = time.perf_counter()
+    if request.args.get('profile', '').lower() in ['true', '1', 'yes', 'y'] and profile_lock.acquire(blocking=False):
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+def after_request(response):
+    if not enabled or 'request_start' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_start
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    registry.observe('maze_request_seconds', {'route': route}, elapsed)
+    if not response.is_streamed:
+        registry.observe('maze_response_bytes', {'route': route}, len(response.get_data()))
+    
+    # Durations are in milliseconds in Server-Timing
+    timings = g.get('phase_timings', {})
+    entries = [f'{name};dur={seconds * 1000:.3f}' for name, seconds in timings.items()]
+    entries.append(f'total;dur={elapsed * 1000:.3f}')
+    response.headers['Server-Timing'] = ', '.join(entries)
+    
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        profile_lock.release()
+        path = write_profile(profiler)
+        response.headers['X-Profile'] = os.path.basename(path)
+    return response
+
+def teardown_request(exc):
+    # Requests that failed never reach after_request; stop their profiler here
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        profile_lock.release()
+
+def write_profile(profiler):
+    """Dump a profile to profile_dir and return its path"""
+    os.makedirs(profile_dir, exist_ok=True)
+    path = os.path.join(profile_dir, f'{time.strftime("%Y%m%d-%H%M%S")}-{threading.get_ident()}.prof')
+    profiler.dump_stats(path)
+    return path
+
+def init_app(app):
+    """Install the request hooks on a Flask app"""
+    global profile_dir
+    if profile_dir is None:
+        profile_dir = os.path.join(app.instance_path, 'profiles')
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.teardown_request(teardown_request)
+
+def render_metrics():
+    """Return the recorded metrics in Prometheus text format"""
+    return registry.render()
@@ -0,0 +1,197 @@
+"""Load test that replays page views, toggles and path listings against the app
+
+Run with:
+    python loadtest.py                                  # in-process, sizes 64 and 256
+    python loadtest.py --mix toggle-storm --concurrency 1 8 32
+    python loadtest.py --mix view=6,toggle=3,paths=1 --no-cache
+    python loadtest.py --url http://127.0.0.1:5002      # against a running server
+
+Each simulated user keeps its own session cookie. Requests run in-process
+through Flask's test client unless --url is given, and latency percentiles
+and throughput are reported for every maze size and concurrency level.
+"""
+import argparse
+import http.cookiejar
+import json
+import math
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import app
+
+DEFAULT_SIZES = [64, 256]
+DEFAULT_CONCURRENCY = [1, 4, 16]
+
+# Named request mixes: relative weight of each kind of request
+MIXES = {
+    'browse': {'view': 6, 'reveal': 2, 'paths': 2},
+    'toggle-storm': {'toggle': 8, 'paths': 1, 'view': 1},
+    'reveal': {'reveal': 1},
+    'mixed': {'view': 4, 'toggle': 3, 'paths': 2, 'reveal': 1},
+}
+
+def parse_mix(text):
+    """Return the weights of a named mix or of "kind=weight,..." """
+    if text in MIXES:
+        return MIXES[text]
+    weights = {}
+    for part in text.split(','):
+        kind, _, weight = part.partition('=')
+        if kind not in REQUESTS:
+            raise argparse.ArgumentTypeError(f"unknown request kind {kind!r} (choose from {', '.join(REQUESTS)})")
+        weights[kind] = int(weight or 1)
+    return weights
+
+def view_request(labels, rng):
+    """A page showing one to three paths picked by label"""
+    query = urllib.parse.urlencode([('path', label) for label in rng.sample(labels, min(len(labels), rng.randint(1, 3)))])
+    return f'/?{query}'
+
+def reveal_request(labels, rng):
+    return '/?reveal_all=1'
+
+def toggle_request(labels, rng):
+    return f'/toggle/{urllib.parse.quote(rng.choice(labels))}'
+
+def paths_request(labels, rng):
+    return '/paths'
+
+REQUESTS = {
+    'view': view_request,
+    'reveal': reveal_request,
+    'toggle': toggle_request,
+    'paths': paths_request,
+}
+
+class TestClientUser:
+    """A user that sends requests through Flask's test client"""
+    def __init__(self, base_url=None):
+        self.client = app.app.test_client()
+    
+    def get(self, url):
+        return self.client.get(url).status_code
+
+class HTTPUser:
+    """A user that sends requests to a running server, keeping its cookies"""
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    
+    def get(self, url):
+        try:
+            with self.opener.open(self.base_url + url) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as error:
+            return error.code
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(fraction * len(sorted_values))
+    return sorted_values[max(0, rank - 1)]
+
+def run_level(user_class, base_url, labels, weights, concurrency, total, seed):
+    """Send total requests from concurrency users; returns the level's figures"""
+    kinds = list(weights)
+    kind_weights = [weights[kind] for kind in kinds]
+    latencies = []
+    errors = 0
+    remaining = [total]
+    lock = threading.Lock()
+    
+    def user_loop(user_number):
+        nonlocal errors
+        rng = random.Random(seed * 1000 + user_number)
+        user = user_class(base_url)
+        own_latencies = []
+        own_errors = 0
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    break
+                remaining[0] -= 1
+            kind = rng.choices(kinds, kind_weights)[0]
+            url = REQUESTS[kind](labels, rng)
+            start = time.perf_counter()
+            status = user.get(url)
+            own_latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                own_errors += 1
+        with lock:
+            latencies.extend(own_latencies)
+            errors += own_errors
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(user_loop, range(concurrency)))
+    elapsed = time.perf_counter() - start
+    
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': len(latencies) / elapsed,
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+    }
+
+def serve_size(size, seed, no_cache):
+    """Make a maze of the given size the app's shared maze; returns its labels"""
+    app.maze = app.generate_maze(size, seed=seed)
+    if no_cache:
+        app.maze.render_cache.maxsize = 0
+    return sorted(path.label.lower() for path in app.maze.paths.values())
+
+def report(label, concurrency, figures):
+    print(f'{label:<10} c={concurrency:<4} {figures["throughput"]:>9.1f} req/s  '
+          f'p50 {figures["p50"] * 1e3:>8.2f} ms  p95 {figures["p95"] * 1e3:>8.2f} ms  p99 {figures["p99"] * 1e3:>8.2f} ms'
+          + (f'  errors {figures["errors"]}' if figures['errors'] else ''))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mix', type=parse_mix, default='mixed',
+                        help=f'request mix: {", ".join(MIXES)}, or weights like view=5,toggle=3,paths=1,reveal=1')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='maze sizes to test (in-process only)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=DEFAULT_CONCURRENCY, help='simultaneous users per level')
+    parser.add_argument('--requests', type=int, default=500, help='requests per level')
+    parser.add_argument('--no-cache', action='store_true', help='disable the render cache so every page is drawn (in-process only)')
+    parser.add_argument('--url', help='base URL of a running server instead of the in-process test client')
+    parser.add_argument('--seed', type=int, default=1, help='seed for the mazes and the request sequence')
+    parser.add_argument('--save', help='write results to this JSON file')
+    args = parser.parse_args()
+    
+    results = {'mix': args.mix, 'levels': {}}
+    if args.url:
+        targets = ['server']
+        user_class = HTTPUser
+    else:
+        targets = args.sizes
+        user_class = TestClientUser
+    
+    for target in targets:
+        if args.url:
+            labels = sorted(json.loads(urllib.request.urlopen(args.url.rstrip('/') + '/labels').read()))
+        else:
+            labels = serve_size(target, args.seed, args.no_cache)
+        label = str(target)
+        for concurrency in args.concurrency:
+            figures = run_level(user_class, args.url, labels, args.mix, concurrency, args.requests, args.seed)
+            results['levels'].setdefault(label, {})[str(concurrency)] = figures
+            report(label, concurrency, figures)
+    
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or '.', exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
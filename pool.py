@@ -0,0 +1,169 @@
+import logging
+import os
+import pickle
+import random
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+class MazePool:
+    """Seeded mazes, pregenerated in the background and kept in an LRU
+    
+    Mazes are looked up by seed in memory first, then in the on-disk cache
+    (so restarts stay warm), and are only generated when neither has them.
+    A few unseen seeds are always kept ready so "new maze" requests never
+    wait for generation.
+    """
+    def __init__(self, factory, size=64, capacity=32, cache_dir=None, max_files=1000, warm=4, workers=1, validator=None):
+        self.factory = factory  # Called as factory(size=..., seed=...) to build a maze
+        self.validator = validator  # Called on each new maze; returns a list of problems
+        self.size = size
+        self.capacity = capacity  # Mazes kept in memory
+        self.cache_dir = cache_dir  # Directory for pickled mazes, or None to disable
+        self.max_files = max_files  # Pickled mazes kept on disk
+        self.warm = warm  # Unseen seeds to keep pregenerated
+        
+        self.mazes = OrderedDict()
+        self.pending = {}  # Seed -> Future for mazes being generated
+        self.ready = deque()  # Pregenerated seeds not handed out yet
+        self.warming = 0  # Pregenerated seeds still being built
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='maze-pool')
+        
+        self.hits = 0
+        self.disk_hits = 0
+        self.generated = 0
+        self.evictions = 0
+        self.invalid = 0
+        
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self.refill()
+    
+    def get(self, seed):
+        """Return the maze for a seed, loading or generating it if needed"""
+        with self.lock:
+            maze = self.mazes.get(seed)
+            if maze is not None:
+                self.mazes.move_to_end(seed)
+                self.hits += 1
+                return maze
+            future = self.pending.get(seed)
+            if future is None:
+                future = self.executor.submit(self.build, seed)
+                self.pending[seed] = future
+        return future.result()
+    
+    def prefetch(self, seeds):
+        """Start building mazes for the given seeds in the background"""
+        with self.lock:
+            for seed in seeds:
+                if seed not in self.mazes and seed not in self.pending:
+                    self.pending[seed] = self.executor.submit(self.build, seed)
+    
+    def take_new_seed(self):
+        """Return the seed of a pregenerated maze that has not been handed out"""
+        with self.lock:
+            seed = self.ready.popleft() if self.ready else None
+        if seed is None:
+            # Nothing ready yet; fall back to building one now
+            seed = random.getrandbits(32)
+            self.get(seed)
+        self.refill()
+        return seed
+    
+    def refill(self):
+        """Top up the pregenerated seeds in the background"""
+        with self.lock:
+            for _ in range(self.warm - len(self.ready) - self.warming):
+                seed = random.getrandbits(32)
+                self.warming += 1
+                self.pending[seed] = self.executor.submit(self.build, seed, True)
+    
+    def build(self, seed, warm=False):
+        """Load or generate a maze and add it to the pool"""
+        try:
+            maze = self.load(seed)
+            if maze is None:
+                maze = self.factory(size=self.size, seed=seed)
+                problems = self.validator(maze) if self.validator else []
+                if problems:
+                    logger.warning("maze %s failed validation: %s", seed, "; ".join(problems))
+                    with self.lock:
+                        self.invalid += 1
+                self.store(seed, maze)
+                with self.lock:
+                    self.generated += 1
+            else:
+                with self.lock:
+                    self.disk_hits += 1
+        finally:
+            with self.lock:
+                self.pending.pop(seed, None)
+                if warm:
+                    self.warming -= 1
+        
+        with self.lock:
+            self.mazes[seed] = maze
+            self.mazes.move_to_end(seed)
+            while len(self.mazes) > self.capacity:
+                self.mazes.popitem(last=False)
+                self.evictions += 1
+            if warm:
+                self.ready.append(seed)
+        return maze
+    
+    def path_for(self, seed):
+        """Return the cache file for a seed"""
+        return os.path.join(self.cache_dir, f'maze-{self.size}-{seed}.pickle')
+    
+    def load(self, seed):
+        """Read a maze from the on-disk cache, or None"""
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self.path_for(seed), 'rb') as f:
+                return pickle.load(f)
+        except Exception:
+            # Missing, truncated or stale (e.g. pickled from a different module) entries are rebuilt
+            return None
+    
+    def store(self, seed, maze):
+        """Write a maze to the on-disk cache"""
+        if not self.cache_dir:
+            return
+        path = self.path_for(seed)
+        temp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump(maze, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+        self.prune()
+    
+    def prune(self):
+        """Remove the oldest cache files beyond max_files"""
+        entries = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith('.pickle')]
+        if len(entries) <= self.max_files:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_files]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+    
+    def stats(self):
+        """Return the pool counters for monitoring"""
+        with self.lock:
+            return {
+                'size': len(self.mazes),
+                'capacity': self.capacity,
+                'ready': len(self.ready),
+                'pending': len(self.pending),
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'generated': self.generated,
+                'evictions': self.evictions,
+                'invalid': self.invalid
+            }
@@ -0,0 +1,118 @@
+# Names of the fixed parts of the maze that act as extra graph nodes
+ENTRANCE = 'entrance'
+EXIT = 'exit'
+HUB = 'hub'
+
+def touching(a, b):
+    """Check whether two cell rectangles overlap or share an edge
+    
+    Rectangles are (x0, y0, x1, y1) with inclusive bounds. Cells only
+    connect through their sides, so diagonal neighbours do not touch.
+    """
+    dx = max(0, max(a[0], b[0]) - min(a[2], b[2]))
+    dy = max(0, max(a[1], b[1]) - min(a[3], b[3]))
+    return dx + dy <= 1
+
+class SegmentIndex:
+    """Which segments, and so which paths, of a maze touch each other
+    
+    Every clipped segment becomes a rectangle of cells, along with the
+    hub, the entrance and the exit. Touching pairs are found with a sweep
+    over rectangles sorted by their first row, which keeps only the
+    rectangles that can still reach the current row active. Connectivity
+    queries then run on this small graph instead of on grid cells, and
+    agree with a flood fill of the drawn grid.
+    """
+    def __init__(self, maze):
+        self.maze = maze
+        self.owners = []  # Path ID (or ENTRANCE/EXIT/HUB) of each node
+        self.rects = []  # Cell rectangle of each node
+        self.adjacency = []  # Neighbouring node indices of each node
+        
+        cx, cy = maze.center
+        limit = maze.size - 1
+        self.add_node(HUB, (max(0, cx - maze.empty_size), max(0, cy - maze.empty_size),
+                            min(limit, cx + maze.empty_size), min(limit, cy + maze.empty_size)))
+        self.add_node(ENTRANCE, maze.entrance + maze.entrance)
+        self.add_node(EXIT, maze.exit + maze.exit)
+        for path_id, path in maze.paths.items():
+            for coords in path.segment_coords():
+                x0, y0, x1, y1 = maze.clip_coords(*coords)
+                if x0 == x1 or y0 == y1:
+                    self.add_node(path_id, (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)))
+        
+        self.sweep()
+    
+    def add_node(self, owner, rect):
+        """Add a rectangle owned by a path or a fixed part of the maze"""
+        self.owners.append(owner)
+        self.rects.append(rect)
+        self.adjacency.append([])
+    
+    def sweep(self):
+        """Find all touching pairs of rectangles"""
+        order = sorted(range(len(self.rects)), key=lambda node: self.rects[node][0])
+        active = []
+        for node in order:
+            rect = self.rects[node]
+            # Rectangles ending more than one row above this one can never touch it again
+            active = [other for other in active if self.rects[other][2] >= rect[0] - 1]
+            for other in active:
+                if touching(rect, self.rects[other]):
+                    self.adjacency[node].append(other)
+                    self.adjacency[other].append(node)
+            active.append(node)
+    
+    def path_graph(self):
+        """Return the path-level graph: each path (or fixed part) and what it touches"""
+        graph = {}
+        for node, neighbours in enumerate(self.adjacency):
+            owner = self.owners[node]
+            touched = graph.setdefault(owner, set())
+            for neighbour in neighbours:
+                if self.owners[neighbour] != owner:
+                    touched.add(self.owners[neighbour])
+        return {owner: sorted(neighbours) for owner, neighbours in graph.items()}
+    
+    def is_present(self, owner, visible):
+        """Check whether a node's owner is on the grid for a visibility set"""
+        return owner in (ENTRANCE, EXIT, HUB) or owner in visible
+    
+    def reachable(self, start, visible):
+        """Return the owners reachable from start using only visible paths"""
+        nodes = [node for node, owner in enumerate(self.owners) if owner == start]
+        if not nodes or not self.is_present(start, visible):
+            return set()
+        seen = set(nodes)
+        queue = list(nodes)
+        for node in queue:
+            for neighbour in self.adjacency[node]:
+                if neighbour not in seen and self.is_present(self.owners[neighbour], visible):
+                    seen.add(neighbour)
+                    queue.append(neighbour)
+        return {self.owners[node] for node in seen}
+    
+    def can_reach(self, start, goal, visible):
+        """Check whether goal can be reached from start using only visible paths"""
+        return goal in self.reachable(start, visible)
+    
+    def components(self, visible):
+        """Group the present owners into connected components
+        
+        A path split into separate pieces (like Links) can appear in more
+        than one component.
+        """
+        labels = [-1] * len(self.owners)
+        components = []
+        for node, owner in enumerate(self.owners):
+            if labels[node] != -1 or not self.is_present(owner, visible):
+                continue
+            labels[node] = len(components)
+            queue = [node]
+            for current in queue:
+                for neighbour in self.adjacency[current]:
+                    if labels[neighbour] == -1 and self.is_present(self.owners[neighbour], visible):
+                        labels[neighbour] = len(components)
+                        queue.append(neighbour)
+            components.append(sorted({self.owners[member] for member in queue}))
+        return components
@@ -0,0 +1,191 @@
+"""Maze and channel state shared by every worker process on a host
+
+The current maze is written once to a file and memory-mapped read-only by
+each worker, so its grid is a single zero-copy buffer however many workers
+run. A small control file holds the current maze's token and a version
+counter, plus a table of channel visibility masks. Writers take an
+exclusive lock on the control file and bump the version; readers compare
+versions and only reload what changed.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+
+CONTROL_MAGIC = b'MAZECTL1'
+
+# Control file header: magic, maze version, token of the current maze
+HEADER = struct.Struct('<8sQ64s')
+
+# Bytes per channel visibility mask (one bit per path)
+MASK_BYTES = 24
+
+# Channel slot: key hash, version, visibility mask
+SLOT = struct.Struct(f'<8sQ{MASK_BYTES}s')
+
+# Maze files kept besides the current one, for workers still switching over
+KEEP_MAZES = 4
+
+class SharedStore:
+    """A directory of memory-mapped maze files plus a locked control file"""
+    def __init__(self, directory, slots=256):
+        self.directory = directory
+        self.slots = slots
+        os.makedirs(directory, exist_ok=True)
+        
+        self.path = os.path.join(directory, 'control.bin')
+        self.open()
+        with self.lock():
+            size = HEADER.size + SLOT.size * slots
+            if os.fstat(self.control_file.fileno()).st_size < size:
+                self.control_file.truncate(size)
+                self.control_file.seek(0)
+                self.control_file.write(HEADER.pack(CONTROL_MAGIC, 0, b''))
+                self.control_file.flush()
+        self.control = mmap.mmap(self.control_file.fileno(), size)
+        
+        self.maze_version = 0  # Version of the maze mapped by this process
+        self.maze = None
+    
+    def open(self):
+        """Open the control file for locking in this process"""
+        self.pid = os.getpid()
+        # flock() only excludes other processes; threads of this one share a lock
+        self.thread_lock = threading.Lock()
+        self.control_file = os.fdopen(os.open(self.path, os.O_RDWR | os.O_CREAT), 'r+b')
+    
+    @contextmanager
+    def lock(self):
+        """Hold the store's write lock across threads and processes"""
+        # Forked workers share the parent's open file, which flock() would treat as one holder
+        if self.pid != os.getpid():
+            self.open()
+        with self.thread_lock:
+            fcntl.flock(self.control_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self.control_file, fcntl.LOCK_UN)
+    
+    def header(self):
+        """Return (maze version, token) from the control file"""
+        _, version, token = HEADER.unpack_from(self.control, 0)
+        return version, token.rstrip(b'\0').decode('ascii')
+    
+    def maze_path(self, token):
+        return os.path.join(self.directory, f'maze-{token}.bin')
+    
+    def current_maze(self, factory, loader):
+        """Return the current shared maze, creating and publishing it if there is none
+        
+        factory() builds a new maze and loader(buffer) rebuilds one from the
+        bytes written by publish().
+        """
+        version, _ = self.header()
+        if version == self.maze_version and self.maze is not None:
+            return self.maze
+        with self.lock():
+            version, token = self.header()
+            if version == 0:
+                # Only the first worker to get here generates the maze
+                self.write_maze(factory())
+                version, token = self.header()
+            try:
+                maze = self.map_maze(token, loader)
+            except Exception:
+                # Missing or stale (e.g. written by an older version) mazes are replaced
+                self.write_maze(factory())
+                version, token = self.header()
+                maze = self.map_maze(token, loader)
+        self.maze = maze
+        self.maze_version = version
+        return maze
+    
+    def map_maze(self, token, loader):
+        """Memory-map a maze file and rebuild the maze from it (caller holds the lock, so it cannot be pruned first)"""
+        with open(self.maze_path(token), 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return loader(buffer)
+    
+    def publish(self, maze):
+        """Make maze the current shared maze"""
+        with self.lock():
+            self.write_maze(maze)
+    
+    def write_maze(self, maze):
+        """Write a maze file and point the control file at it (caller holds the lock)"""
+        path = self.maze_path(maze.token)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(maze.to_buffer())
+        os.replace(temp_path, path)
+        version, _ = self.header()
+        HEADER.pack_into(self.control, 0, CONTROL_MAGIC, version + 1, maze.token.encode('ascii'))
+        self.prune()
+    
+    def prune(self):
+        """Remove old maze files; workers that still map one keep their mapping"""
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.startswith('maze-') and entry.name.endswith('.bin')]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:max(0, len(entries) - 1 - KEEP_MAZES)]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+    
+    def slot_key(self, token, name):
+        return hashlib.blake2b(f'{token}\0{name}'.encode('utf-8'), digest_size=8).digest()
+    
+    def find_slot(self, key):
+        """Return (slot number, found) for a key, probing from its hash
+        
+        When the table is full the slot with the lowest version is reused.
+        """
+        start = int.from_bytes(key, 'little') % self.slots
+        oldest = None
+        for probe in range(self.slots):
+            slot = (start + probe) % self.slots
+            slot_key, version, _ = SLOT.unpack_from(self.control, HEADER.size + slot * SLOT.size)
+            if slot_key == key:
+                return slot, True
+            if version == 0:
+                return slot, False
+            if oldest is None or version < oldest[1]:
+                oldest = (slot, version)
+        return oldest[0], False
+    
+    def read_channel(self, token, name):
+        """Return (version, mask) of a channel; version 0 and mask None if never written"""
+        key = self.slot_key(token, name)
+        with self.lock():
+            slot, found = self.find_slot(key)
+            if not found:
+                return 0, None
+            _, version, mask = SLOT.unpack_from(self.control, HEADER.size + slot * SLOT.size)
+        return version, int.from_bytes(mask, 'little')
+    
+    def update_channel(self, token, name, update):
+        """Change a channel's mask under the lock
+        
+        update(version, mask) is called with the stored values (0 and None
+        for a new channel) and returns the new mask, or None to leave it
+        unchanged. Returns the channel's version afterwards.
+        """
+        key = self.slot_key(token, name)
+        with self.lock():
+            slot, found = self.find_slot(key)
+            offset = HEADER.size + slot * SLOT.size
+            if found:
+                _, version, mask = SLOT.unpack_from(self.control, offset)
+                mask = int.from_bytes(mask, 'little')
+            else:
+                version, mask = 0, None
+            mask = update(version, mask)
+            if mask is None:
+                return version
+            version += 1
+            SLOT.pack_into(self.control, offset, key, version, mask.to_bytes(MASK_BYTES, 'little'))
+        return version
@@ -0,0 +1,172 @@
+import re
+from array import array
+
+# Cell code of walls in the grid (app.WALL); every other code is walkable
+WALL = 0
+
+# Runs of walkable cells in a flat grid
+WALKABLE_RUN = re.compile(rb'[^\x00]+')
+
+class GridGraph:
+    """Walkable cells of a drawn grid, searched with BFS on flat indices
+    
+    Cells are 4-connected. Parents and component labels are kept in flat
+    arrays, so large grids cost a few bytes per cell rather than a Python
+    object per cell. An optional open area (x0, y0, x1, y1), such as the
+    hub, is known to be fully walkable and is labelled with slice writes
+    instead of being flooded cell by cell.
+    """
+    def __init__(self, cells, size, open_area=None):
+        self.cells = cells
+        self.size = size
+        self.open_area = open_area
+    
+    def bfs(self, start, goal=None):
+        """Breadth-first search from start, stopping early at goal
+        
+        Returns the parent array (-1 for unvisited cells, start is its own
+        parent).
+        """
+        cells = self.cells
+        size = self.size
+        total = len(cells)
+        parents = array('i', [-1]) * total
+        if cells[start] == WALL:
+            return parents
+        parents[start] = start
+        queue = [start]
+        for index in queue:
+            if index == goal:
+                break
+            column = index % size
+            for neighbour in (index - size, index + size,
+                              index - 1 if column > 0 else -1,
+                              index + 1 if column < size - 1 else -1):
+                if 0 <= neighbour < total and parents[neighbour] == -1 and cells[neighbour] != WALL:
+                    parents[neighbour] = index
+                    queue.append(neighbour)
+        return parents
+    
+    def shortest_path(self, start, goal):
+        """Return the cells of a shortest path from start to goal, or None"""
+        parents = self.bfs(start, goal)
+        if parents[goal] == -1:
+            return None
+        route = [goal]
+        while route[-1] != start:
+            route.append(parents[route[-1]])
+        route.reverse()
+        return route
+    
+    def fill_open_area(self, labels, label):
+        """Label the whole open area and return its border cells"""
+        x0, y0, x1, y1 = self.open_area
+        size = self.size
+        row = array('i', [label]) * (y1 - y0 + 1)
+        for x in range(x0, x1 + 1):
+            labels[x * size + y0:x * size + y1 + 1] = row
+        border = [x * size + y for x in (x0, x1) for y in range(y0, y1 + 1)]
+        border += [x * size + y for x in range(x0 + 1, x1) for y in (y0, y1)]
+        return border
+    
+    def components(self):
+        """Label connected components; returns (labels, count), walls are -1"""
+        cells = self.cells
+        size = self.size
+        total = len(cells)
+        labels = array('i', [-1]) * total
+        if self.open_area:
+            x0, y0, x1, y1 = self.open_area
+            in_open_area = lambda index: x0 <= index // size <= x1 and y0 <= index % size <= y1
+        else:
+            in_open_area = lambda index: False
+        
+        count = 0
+        for run in WALKABLE_RUN.finditer(cells):
+            for seed in range(run.start(), run.end()):
+                if labels[seed] != -1:
+                    continue
+                if in_open_area(seed):
+                    queue = self.fill_open_area(labels, count)
+                else:
+                    labels[seed] = count
+                    queue = [seed]
+                for index in queue:
+                    column = index % size
+                    for neighbour in (index - size, index + size,
+                                      index - 1 if column > 0 else -1,
+                                      index + 1 if column < size - 1 else -1):
+                        if 0 <= neighbour < total and labels[neighbour] == -1 and cells[neighbour] != WALL:
+                            if in_open_area(neighbour):
+                                queue.extend(self.fill_open_area(labels, count))
+                            else:
+                                labels[neighbour] = count
+                                queue.append(neighbour)
+                count += 1
+        return labels, count
+
+def solve(state, include_route=False):
+    """Answer route and reachability queries for a maze state
+    
+    Returns the shortest entrance-to-exit route (its length, and the cells
+    if include_route is set), which visible paths connect back to the
+    entrance and on to the exit, and the number of connected components.
+    """
+    maze = state.maze
+    cx, cy = maze.center
+    hub = (max(0, cx - maze.empty_size), max(0, cy - maze.empty_size),
+           min(maze.size - 1, cx + maze.empty_size), min(maze.size - 1, cy + maze.empty_size))
+    graph = GridGraph(bytes(state.cells), maze.size, hub)
+    entrance = maze.cell_index(*maze.entrance)
+    exit = maze.cell_index(*maze.exit)
+    
+    labels, count = graph.components()
+    solvable = labels[entrance] != -1 and labels[entrance] == labels[exit]
+    
+    result = {
+        'solvable': solvable,
+        'length': None,
+        'components': count,
+        'paths': {}
+    }
+    
+    if solvable:
+        route = graph.shortest_path(entrance, exit)
+        result['length'] = len(route) - 1
+        if include_route:
+            result['route'] = [list(divmod(index, maze.size)) for index in route]
+    
+    for path_id, path in maze.paths.items():
+        if path_id not in state.visible:
+            continue
+        path_labels = {labels[index] for index in path.cell_indices}
+        result['paths'][path_id] = {
+            'label': path.label,
+            'entrance': path_labels == {labels[entrance]},
+            'exit': path_labels == {labels[exit]}
+        }
+    return result
+
+def validate(maze):
+    """Check a maze against the rules in the README; returns a list of problems
+    
+    With every path visible the exit must be reachable, every path must
+    lead back to the entrance, and only one path may reach the exit cell.
+    """
+    state = maze.new_state()
+    result = solve(state)
+    problems = []
+    if not result['solvable']:
+        problems.append('the exit cannot be reached from the entrance')
+    for path_id, info in result['paths'].items():
+        if not info['entrance']:
+            problems.append(f"{info['label']} does not lead back to the entrance")
+    
+    # Paths that run into the exit cell itself
+    exit_x, exit_y = maze.exit
+    next_to_exit = {maze.cell_index(x, y) for x, y in ((exit_x - 1, exit_y), (exit_x + 1, exit_y), (exit_x, exit_y - 1), (exit_x, exit_y + 1), (exit_x, exit_y))
+                    if 0 <= x < maze.size and 0 <= y < maze.size}
+    exit_paths = [path.label for path in maze.paths.values() if not next_to_exit.isdisjoint(path.cell_indices)]
+    if len(exit_paths) != 1:
+        problems.append(f"{len(exit_paths)} paths reach the exit ({', '.join(exit_paths) or 'none'})")
+    return problems